@@ -0,0 +1,130 @@
+import io
+import os
+import threading
+import time
+
+import pandas as pd
+
+from battery import TIMESTAMP_FORMAT
+
+NUMERIC_COLUMNS = ['Current Usage (J)', 'Battery Feel', 'Charged mAh']
+# Bytes before the read offset that must still match for the cache to be valid
+FINGERPRINT_SIZE = 64
+
+
+# Parse CSV log bytes (header line included) into a DataFrame with battery
+# codes kept as strings and timestamps and numeric columns already converted
+def parse_log_bytes(data):
+    frame = pd.read_csv(io.BytesIO(data), dtype=str)
+    if 'Timestamp' in frame:
+        frame['Timestamp'] = pd.to_datetime(frame['Timestamp'], format=TIMESTAMP_FORMAT, errors='coerce')
+    for column in NUMERIC_COLUMNS:
+        if column in frame:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce')
+    return frame
+
+
+# Process-wide DataFrame view of the CSV log. It remembers how far into the
+# file it has read, so each request only parses rows appended since the last
+# one. If the file is truncated, replaced or rewritten the cache is rebuilt.
+class LogCache:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._frame = None
+        self._offset = 0
+        self._header = b''
+        self._fingerprint = b''
+        self._identity = None
+
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.rows_appended = 0
+        self.last_rebuild_seconds = 0.0
+        self.total_rebuild_seconds = 0.0
+
+    # Return the log as a DataFrame. Callers must treat it as read-only.
+    def frame(self):
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                return pd.DataFrame()
+
+            with open(self.path, 'rb') as file:
+                if self._frame is None or not self._still_valid(file, stat):
+                    self._rebuild(file, stat)
+                elif stat.st_size == self._offset:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    self._read_tail(file)
+            return self._frame
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'rebuilds': self.rebuilds,
+                'rows': 0 if self._frame is None else len(self._frame),
+                'rows_appended': self.rows_appended,
+                'bytes_read': self._offset,
+                'last_rebuild_seconds': self.last_rebuild_seconds,
+                'total_rebuild_seconds': self.total_rebuild_seconds
+            }
+
+    def _reset(self):
+        self._frame = None
+        self._offset = 0
+        self._header = b''
+        self._fingerprint = b''
+        self._identity = None
+
+    def _still_valid(self, file, stat):
+        if (stat.st_dev, stat.st_ino) != self._identity or stat.st_size < self._offset:
+            return False
+        # Catch in-place rewrites that kept the file at least as long
+        if file.read(len(self._header)) != self._header:
+            return False
+        start = max(self._offset - FINGERPRINT_SIZE, 0)
+        file.seek(start)
+        return file.read(self._offset - start) == self._fingerprint
+
+    def _rebuild(self, file, stat):
+        started = time.perf_counter()
+        self._reset()
+        file.seek(0)
+        data = file.read()
+        end = data.rfind(b'\n') + 1
+        header_end = data.find(b'\n') + 1
+        self._header = data[:header_end]
+        if header_end:
+            self._identity = (stat.st_dev, stat.st_ino)
+            self._frame = parse_log_bytes(data[:end])
+            self._advance(data[:end], end)
+        else:
+            # No header yet: stay invalid so the next call rebuilds
+            self._frame = pd.DataFrame()
+
+        self.rebuilds += 1
+        self.last_rebuild_seconds = time.perf_counter() - started
+        self.total_rebuild_seconds += self.last_rebuild_seconds
+
+    def _read_tail(self, file):
+        file.seek(self._offset)
+        data = file.read()
+        # Only consume complete lines; a half-written row waits for next time
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return
+        rows = parse_log_bytes(self._header + data[:end])
+        self.rows_appended += len(rows)
+        self._frame = pd.concat([self._frame, rows], ignore_index=True) if len(self._frame) else rows
+        self._advance(data[:end], self._offset + end)
+
+    def _advance(self, consumed, offset):
+        self._offset = offset
+        self._fingerprint = (self._fingerprint + consumed)[-FINGERPRINT_SIZE:]
@@ -0,0 +1,127 @@
+import json
+import time
+from enum import IntEnum
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+# Battery lifecycle, in the order a battery goes through it
+class Status(IntEnum):
+    CHARGING = 0
+    COOLDOWN_TO_ROBOT = 1
+    READY_FOR_ROBOT = 2
+    IN_USE = 3
+    COOLDOWN_TO_CHARGE = 4
+    READY_FOR_CHARGING = 5
+
+    # The name shown in the UI and written to the log
+    @property
+    def label(self):
+        return STATUS_LABELS[self]
+
+    @classmethod
+    def from_label(cls, label):
+        try:
+            return LABEL_TO_STATUS[label]
+        except KeyError:
+            raise ValueError(f"Unknown battery status {label!r}")
+
+
+STATUS_LABELS = ("Charging", "Cooldown To Robot", "Ready for ROBOT", "In Use", "Cooldown To Charge",
+                 "Ready for CHARGING")
+LABEL_TO_STATUS = {label: Status(value) for value, label in enumerate(STATUS_LABELS)}
+
+# NEXT_STATUS[status] is the only status a scan can move a battery to
+NEXT_STATUS = (
+    Status.COOLDOWN_TO_ROBOT,   # Charging
+    Status.READY_FOR_ROBOT,     # Cooldown To Robot
+    Status.IN_USE,              # Ready for ROBOT
+    Status.COOLDOWN_TO_CHARGE,  # In Use
+    Status.READY_FOR_CHARGING,  # Cooldown To Charge
+    Status.CHARGING             # Ready for CHARGING
+)
+
+# COOLDOWN_TARGET[status] is where a cooldown ends up, or None if the status
+# is not a cooldown
+COOLDOWN_TARGET = (None, Status.READY_FOR_ROBOT, None, None, Status.READY_FOR_CHARGING, None)
+
+# Statuses that ask for advanced logging input when entered
+ADVANCED_INPUT_STATUSES = frozenset((Status.IN_USE, Status.CHARGING))
+
+
+def format_timestamp(epoch):
+    return time.strftime(TIMESTAMP_FORMAT, time.localtime(epoch))
+
+
+def parse_timestamp(text):
+    return time.mktime(time.strptime(text, TIMESTAMP_FORMAT))
+
+
+# One battery's state. last_change is seconds since the epoch. The stored form
+# (to_dict) and the API fragment (api_json) are built on first use and
+# dropped whenever a field is assigned.
+class BatteryRecord:
+    __slots__ = ('status', 'last_change', 'usage_count', 'notes', 'current_usage', 'battery_feel', 'charged_mAh',
+                 'awaiting_advanced_input', '_dict', '_api_json')
+
+    def __init__(self, status=Status.CHARGING, last_change=None, usage_count=0, notes='', current_usage=None,
+                 battery_feel=None, charged_mAh=None, awaiting_advanced_input=False):
+        self.status = status
+        self.last_change = time.time() if last_change is None else last_change
+        self.usage_count = usage_count
+        self.notes = notes
+        self.current_usage = current_usage
+        self.battery_feel = battery_feel
+        self.charged_mAh = charged_mAh
+        self.awaiting_advanced_input = awaiting_advanced_input
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name[0] != '_':
+            object.__setattr__(self, '_dict', None)
+            object.__setattr__(self, '_api_json', None)
+
+    @property
+    def cooldown_target(self):
+        return COOLDOWN_TARGET[self.status]
+
+    # Stored form (battery_status.json, the state journal). Callers must not
+    # modify the returned dict.
+    def to_dict(self):
+        if self._dict is None:
+            object.__setattr__(self, '_dict', {
+                'status': self.status.label,
+                'last_change': format_timestamp(self.last_change),
+                'usage_count': self.usage_count,
+                'notes': self.notes,
+                'current_usage': self.current_usage,
+                'battery_feel': self.battery_feel,
+                'charged_mAh': self.charged_mAh,
+                'awaiting_advanced_input': self.awaiting_advanced_input
+            })
+        return self._dict
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            status=Status.from_label(data['status']),
+            last_change=parse_timestamp(data['last_change']),
+            usage_count=data.get('usage_count', 0),
+            notes=data.get('notes', ''),
+            current_usage=data.get('current_usage'),
+            battery_feel=data.get('battery_feel'),
+            charged_mAh=data.get('charged_mAh'),
+            awaiting_advanced_input=data.get('awaiting_advanced_input', False)
+        )
+
+    # The unchanging part of this battery's /api/battery_status entry: a JSON
+    # object missing its closing brace, so per-request fields can be appended
+    def api_json(self, code):
+        if self._api_json is None or self._api_json[0] != code:
+            object.__setattr__(self, '_api_json', (code, json.dumps({
+                'battery_code': code,
+                'status': self.status.label,
+                'last_change': format_timestamp(self.last_change),
+                'notes': self.notes
+            })[:-1]))
+        return self._api_json[1]
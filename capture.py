@@ -0,0 +1,161 @@
+import threading
+import time
+from frame_sources import DeviceSource, Pacer
+from metrics import RateMeter
+
+
+# A single frame published by the capture thread
+class CapturedFrame:
+    __slots__ = ('seq', 'timestamp', 'image')
+
+    def __init__(self, seq, timestamp, image):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.image = image
+
+
+# Owns the camera. One thread reads the device and publishes the newest
+# frame; the scanner and every video viewer read it through their own
+# FrameSubscriber, so nobody else ever calls cap.read(). Consumers only ever
+# want the newest frame, so older ones are not kept. name is the station's
+# name and also names the capture thread.
+#
+# open_source, if given, is called on the capture thread and returns any
+# frame source (see frame_sources.py) instead of the camera. Recorded sources
+# are replayed at their own frame rate when paced, or as fast as they can be
+# read otherwise.
+class FrameProducer:
+    def __init__(self, device_index=0, width=320, height=240, open_source=None, paced=True, name=''):
+        self.name = name
+        self.device_index = device_index
+        self.width = width
+        self.height = height
+        self.open_source = open_source
+        self.paced = paced
+        self.capture_rate = RateMeter()
+        self._latest = None
+        self._condition = threading.Condition()
+        self._seq = 0
+        self._finished = False
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=f'capture-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def finished(self):
+        return self._finished
+
+    # The source is only opened once the capture thread runs, so creating a
+    # producer needs no camera stack
+    def _open_device(self):
+        if self.open_source is not None:
+            return self.open_source()
+        return DeviceSource(self.device_index, self.width, self.height)
+
+    def _run(self):
+        cap = None
+        try:
+            cap = self._open_device()
+            pacer = Pacer(cap.fps if self.paced else None)
+            while not self._stop_event.is_set():
+                ret, image = cap.read()
+                if not ret:
+                    print("Failed to capture image" if cap.fps is None else "Frame source finished")
+                    break
+                self._publish(image)
+                pacer.wait(self._stop_event)
+        except Exception as e:
+            print(f"Could not open frame source: {e}" if cap is None else f"Capture failed: {e}")
+        finally:
+            if cap is not None:
+                cap.release()
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    def _publish(self, image):
+        with self._condition:
+            self._seq += 1
+            self._latest = CapturedFrame(self._seq, time.time(), image)
+            self._condition.notify_all()
+        self.capture_rate.mark()
+
+    def latest(self):
+        with self._condition:
+            return self._latest
+
+    # Block until a frame newer than after_seq is available. Always returns the
+    # newest frame: anything older is stale and gets skipped.
+    def wait_for_frame(self, after_seq, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._latest is None or self._latest.seq <= after_seq:
+                if self._finished:
+                    return None
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+            return self._latest
+
+    def subscribe(self, name=''):
+        subscriber = FrameSubscriber(self, name)
+        with self._subscribers_lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._subscribers_lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._subscribers_lock:
+            return len(self._subscribers)
+
+
+# A consumer's read cursor into the producer's frame sequence
+class FrameSubscriber:
+    def __init__(self, producer, name=''):
+        self.producer = producer
+        self.name = name
+        self.last_seq = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+
+    @property
+    def closed(self):
+        return self.producer.finished
+
+    def read(self, timeout=None):
+        frame = self.producer.wait_for_frame(self.last_seq, timeout)
+        if frame is None:
+            return None
+        if self.last_seq:
+            self.frames_dropped += frame.seq - self.last_seq - 1
+        self.last_seq = frame.seq
+        self.frames_read += 1
+        return frame
+
+    def close(self):
+        self.producer.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
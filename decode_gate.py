@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+
+
+# Cheap pre-decode check in front of pyzbar. A frame is only decoded when it
+# differs enough from the last decoded frame, and then only the region that
+# changed is handed to the decoder, optionally downscaled.
+class DecodeGate:
+    def __init__(self, motion_threshold=0.002, downscale=1.0, pixel_threshold=25, roi_margin=24,
+                 refresh_frames=30):
+        # Fraction of pixels that must change before a frame is decoded
+        self.motion_threshold = motion_threshold
+        # Scale factor applied to the region before decoding (1.0 = full size)
+        self.downscale = downscale
+        # Per-pixel grayscale difference that counts as "changed"
+        self.pixel_threshold = pixel_threshold
+        # Padding around the changed area so a barcode is not cut in half
+        self.roi_margin = roi_margin
+        # Force a full-frame decode after this many skipped frames in a row
+        self.refresh_frames = refresh_frames
+
+        self.frames_skipped = 0
+        self.frames_decoded = 0
+        self._last_gray = None
+        self._skipped_in_a_row = 0
+
+    # Return the image to decode for this frame, or None to skip it
+    def select(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        region = gray
+
+        full_frame = (
+            self._last_gray is None
+            or self._last_gray.shape != gray.shape
+            or self._skipped_in_a_row >= self.refresh_frames
+        )
+        if not full_frame:
+            changed = cv2.absdiff(gray, self._last_gray) > self.pixel_threshold
+            changed_pixels = np.count_nonzero(changed)
+            if not changed_pixels or changed_pixels < self.motion_threshold * changed.size:
+                self.frames_skipped += 1
+                self._skipped_in_a_row += 1
+                return None
+            region = self._changed_region(gray, changed)
+
+        self._last_gray = gray
+        self._skipped_in_a_row = 0
+        self.frames_decoded += 1
+
+        if self.downscale < 1.0:
+            region = cv2.resize(region, None, fx=self.downscale, fy=self.downscale,
+                                interpolation=cv2.INTER_AREA)
+        return region
+
+    def _changed_region(self, gray, changed):
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        height, width = gray.shape
+        top = max(rows[0] - self.roi_margin, 0)
+        bottom = min(rows[-1] + self.roi_margin + 1, height)
+        left = max(cols[0] - self.roi_margin, 0)
+        right = min(cols[-1] + self.roi_margin + 1, width)
+        return gray[top:bottom, left:right]
+
+    def stats(self):
+        total = self.frames_skipped + self.frames_decoded
+        return {
+            'frames_skipped': self.frames_skipped,
+            'frames_decoded': self.frames_decoded,
+            'skip_ratio': self.frames_skipped / total if total else 0.0
+        }
@@ -0,0 +1,196 @@
+import heapq
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# Runs in each worker process: decode frames straight out of shared memory and
+# send back only the decoded strings. The first message says the worker is
+# ready, which can take a while with the spawn start method.
+def _decode_worker(name, slot_names, jobs, results):
+    from pyzbar.pyzbar import decode
+
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    results.put((None, name, None))
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            seq, slot, shape, dtype = job
+            image = np.ndarray(shape, dtype=dtype, buffer=slots[slot].buf)
+            try:
+                codes = [barcode.data.decode('utf-8') for barcode in decode(image)]
+            except Exception as e:
+                print(f"Decode worker error: {e}")
+                codes = []
+            del image
+            results.put((seq, slot, codes))
+    finally:
+        for shm in slots:
+            shm.close()
+
+
+# Optional multi-process decoder. Frames are copied into a fixed set of
+# shared-memory slots (one per queued frame) instead of being pickled, and
+# results are handed back to on_result strictly in the order the frames were
+# submitted.
+#
+# A frame whose result has not come back within result_timeout (its worker
+# died, or the result was lost) is given up on: its slot is freed and the
+# results queued behind it are released. Workers that died are started again.
+# The timeout only runs while every worker is up, and counts from the last
+# time one came up, so slow worker starts do not count as lost frames.
+class DecodePool:
+    def __init__(self, on_result, workers=2, queue_depth=4, slot_size=1920 * 1080 * 3, result_timeout=2.0):
+        self.on_result = on_result
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.slot_size = slot_size
+        self.result_timeout = result_timeout
+        self.frames_submitted = 0
+        self.frames_dropped = 0
+        self.results_lost = 0
+        self.workers_restarted = 0
+
+        self._context = multiprocessing.get_context('spawn')
+        self._slots = []
+        self._free_slots = queue.Queue()
+        self._jobs = None
+        self._results = None
+        self._processes = []
+        self._collector = None
+        self._stopping = False
+        self._next_submit_seq = 0
+        self._next_result_seq = 0
+        self._pending = []
+        # seq -> (slot, submit time, capture timestamp) for frames being decoded
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._starting = set()
+        self._ready_at = 0.0
+
+    def _start_worker(self, index):
+        name = f'decode-worker-{index}'
+        slot_names = [shm.name for shm in self._slots]
+        process = self._context.Process(target=_decode_worker, args=(name, slot_names, self._jobs, self._results),
+                                        name=name, daemon=True)
+        self._starting.add(name)
+        process.start()
+        return process
+
+    def start(self):
+        for index in range(self.queue_depth):
+            self._slots.append(shared_memory.SharedMemory(create=True, size=self.slot_size))
+            self._free_slots.put(index)
+
+        self._jobs = self._context.Queue()
+        self._results = self._context.Queue()
+        for index in range(self.workers):
+            self._processes.append(self._start_worker(index))
+
+        self._collector = threading.Thread(target=self._collect_results, name='decode-collector', daemon=True)
+        self._collector.start()
+
+    # Queue a frame for decoding. Never blocks: when every slot is busy the
+    # frame is dropped, since a newer one will arrive shortly.
+    def submit(self, image, timestamp=None):
+        if image.nbytes > self.slot_size:
+            raise ValueError(f"Frame of {image.nbytes} bytes does not fit in a {self.slot_size} byte slot")
+        try:
+            slot = self._free_slots.get_nowait()
+        except queue.Empty:
+            self.frames_dropped += 1
+            return False
+
+        view = np.ndarray(image.shape, dtype=image.dtype, buffer=self._slots[slot].buf)
+        np.copyto(view, image)
+        del view
+
+        with self._lock:
+            seq = self._next_submit_seq
+            self._next_submit_seq += 1
+            self._in_flight[seq] = (slot, time.monotonic(), timestamp)
+        self.frames_submitted += 1
+        self._jobs.put((seq, slot, image.shape, image.dtype.str))
+        return True
+
+    def _collect_results(self):
+        while True:
+            try:
+                item = self._results.get(timeout=min(self.result_timeout, 0.5))
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item and item[0] is None:
+                self._starting.discard(item[1])
+                self._ready_at = time.monotonic()
+            elif item:
+                seq, slot, codes = item
+                with self._lock:
+                    job = self._in_flight.pop(seq, None)
+                # A result that was already given up on no longer owns its
+                # slot, which may hold a newer frame by now
+                if job is not None:
+                    self._free_slots.put(slot)
+                    heapq.heappush(self._pending, (seq, codes, job[2]))
+            self._restart_dead_workers()
+            self._release_results()
+
+    # Hand out results in capture order, holding back any that finished ahead
+    # of an earlier frame until that frame's result arrives or times out
+    def _release_results(self):
+        while True:
+            seq = self._next_result_seq
+            if self._pending and self._pending[0][0] == seq:
+                seq, codes, timestamp = heapq.heappop(self._pending)
+                self._next_result_seq += 1
+                try:
+                    self.on_result(seq, codes, timestamp)
+                except Exception as e:
+                    print(f"Error handling decode result: {e}")
+                continue
+            if self._starting:
+                return
+            with self._lock:
+                job = self._in_flight.get(seq)
+                if job is None or max(job[1], self._ready_at) + self.result_timeout > time.monotonic():
+                    return
+                del self._in_flight[seq]
+            self._free_slots.put(job[0])
+            self._next_result_seq += 1
+            self.results_lost += 1
+            print(f"Decode result for frame {seq} lost after {self.result_timeout} s, skipping it")
+
+    def _restart_dead_workers(self):
+        for index, process in enumerate(self._processes):
+            if self._stopping or process.is_alive():
+                continue
+            print(f"Decode worker {process.name} exited with code {process.exitcode}, restarting it")
+            self._processes[index] = self._start_worker(index)
+            self.workers_restarted += 1
+
+    def stop(self, timeout=2):
+        self._stopping = True
+        for _ in self._processes:
+            self._jobs.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+        if self._collector is not None:
+            self._results.put(None)
+            self._collector.join(timeout)
+            self._collector = None
+
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._slots = []
@@ -0,0 +1,68 @@
+import json
+import queue
+import threading
+
+
+# Format a single Server-Sent Events message
+def format_sse(event, data):
+    payload = json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+# One broadcaster shared by every /api/events client. Each client gets its own
+# bounded queue so a slow browser can never block the thread that publishes.
+class EventBroadcaster:
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._clients = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        client = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def client_count(self):
+        with self._lock:
+            return len(self._clients)
+
+    def publish(self, event, data=None):
+        message = format_sse(event, data if data is not None else {})
+        with self._lock:
+            clients = list(self._clients)
+
+        for client in clients:
+            try:
+                client.put_nowait(message)
+            except queue.Full:
+                # The client fell too far behind: throw away its backlog and
+                # tell it to reload the full state instead
+                self._reset_client(client)
+
+    def _reset_client(self, client):
+        while True:
+            try:
+                client.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            client.put_nowait(format_sse('resync', {}))
+        except queue.Full:
+            pass
+
+    # Wake every client with a final 'shutdown' event so streams waiting for
+    # the next message notice the stop flag now rather than at the next
+    # keep-alive
+    def close(self):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait(format_sse('shutdown', {}))
+            except queue.Full:
+                self._reset_client(client)
@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+
+
+# numpy and pandas are imported by the functions that need them, so the
+# cache can be created at startup without loading the analytics stack
+
+# Largest-Triangle-Three-Buckets: pick `threshold` points out of (x, y) that
+# keep the visual shape of the line. Returns the positions of the kept points.
+def lttb(x, y, threshold):
+    import numpy as np
+
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Work relative to the first point so epoch-nanosecond timestamps keep
+    # their precision in the area products
+    x = x - x[0]
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    bucket_size = (n - 2) / (threshold - 2)
+    selected = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        # The third triangle corner is the average of the next bucket (the
+        # last point for the final bucket)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        areas = np.abs((x[selected] - avg_x) * (y[start:end] - y[selected]) -
+                       (x[selected] - x[start:end]) * (avg_y - y[selected]))
+        selected = start + int(areas.argmax())
+        indices[i + 1] = selected
+    return indices
+
+
+# Downsample every series in a frame to at most `budget` points. With `group`
+# set, each group (e.g. each battery code) is its own series.
+def downsample(frame, x, y, budget, group=None):
+    import pandas as pd
+
+    frame = frame.dropna(subset=[x, y])
+    if not budget or len(frame) <= budget:
+        return frame
+    if group is None:
+        parts = [frame]
+    else:
+        parts = [part for _, part in frame.groupby(group, sort=False)]
+
+    kept = []
+    for part in parts:
+        if len(part) <= budget:
+            kept.append(part)
+            continue
+        xs = part[x]
+        if pd.api.types.is_datetime64_any_dtype(xs):
+            xs = xs.astype('int64')
+        kept.append(part.iloc[lttb(xs.to_numpy(), part[y].to_numpy(), budget)])
+    return pd.concat(kept) if len(kept) > 1 else kept[0]
+
+
+# LRU cache of rendered figure payloads. Keys include the log version, so a
+# new log entry simply makes old entries unreachable and they age out.
+class FigureCache:
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
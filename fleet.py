@@ -0,0 +1,73 @@
+import bisect
+import math
+
+OUTLIER_RULES = ('delta', 'zscore')
+
+
+# Running usage aggregates over the fleet: count, sum and sum of squares of
+# usage_count, plus the (usage_count, code) pairs kept sorted so outliers are
+# two binary searches instead of a pass over every battery. Not thread-safe;
+# callers hold battery_status_lock, like for battery_status itself.
+class FleetUsage:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.total_squares = 0
+        self._sorted = []
+
+    def add(self, code, usage_count):
+        bisect.insort(self._sorted, (usage_count, code))
+        self.count += 1
+        self.total += usage_count
+        self.total_squares += usage_count * usage_count
+
+    def remove(self, code, usage_count):
+        index = bisect.bisect_left(self._sorted, (usage_count, code))
+        if index == len(self._sorted) or self._sorted[index] != (usage_count, code):
+            return
+        del self._sorted[index]
+        self.count -= 1
+        self.total -= usage_count
+        self.total_squares -= usage_count * usage_count
+
+    def update(self, code, old_usage_count, new_usage_count):
+        self.remove(code, old_usage_count)
+        self.add(code, new_usage_count)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def stddev(self):
+        if not self.count:
+            return 0.0
+        variance = self.total_squares / self.count - self.mean() ** 2
+        return math.sqrt(max(variance, 0.0))
+
+    # Usage counts at or beyond these bounds are outliers. 'delta' means
+    # mean +/- threshold uses; 'zscore' means threshold standard deviations.
+    def bounds(self, rule='delta', threshold=2):
+        mean = self.mean()
+        if rule == 'delta':
+            spread = threshold
+        elif rule == 'zscore':
+            spread = threshold * self.stddev()
+            if spread == 0:
+                return None  # Everyone is at the mean
+        else:
+            raise ValueError(f"Unknown outlier rule {rule!r}, expected one of {OUTLIER_RULES}")
+        return mean - spread, mean + spread
+
+    # (overused codes, underused codes), most extreme first
+    def outliers(self, rule='delta', threshold=2):
+        bounds = self.bounds(rule, threshold)
+        if not self.count or bounds is None:
+            return [], []
+        low, high = bounds
+        # usage_count is an integer, so >= high starts at ceil(high) and
+        # <= low ends before floor(low) + 1
+        over_start = bisect.bisect_left(self._sorted, (math.ceil(high),))
+        under_end = bisect.bisect_left(self._sorted, (math.floor(low) + 1,))
+        overused = [code for _, code in reversed(self._sorted[over_start:])]
+        # A battery can't be both; overused wins, as in the original scan
+        underused = [code for _, code in self._sorted[:min(under_end, over_start)]]
+        return overused, underused
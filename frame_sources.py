@@ -0,0 +1,219 @@
+import os
+import time
+
+# Where the capture thread gets its frames from. Every source follows the
+# cv2.VideoCapture protocol the capture loop was written against: read()
+# returns (ok, image) with a BGR image, release() frees whatever is open.
+# fps is the rate recorded sources are replayed at when pacing is on; live
+# devices pace themselves and leave it as None.
+SOURCE_KINDS = ('device', 'video', 'images', 'synthetic')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+# EAN-13 digit patterns; R codes are the L codes inverted and G codes are the
+# R codes reversed. The first digit is not drawn, it picks the L/G parity of
+# the left half.
+EAN_L_CODES = ('0001101', '0011001', '0010011', '0111101', '0100011',
+               '0110001', '0101111', '0111011', '0110111', '0001011')
+EAN_R_CODES = tuple(''.join('1' if bit == '0' else '0' for bit in code) for code in EAN_L_CODES)
+EAN_G_CODES = tuple(code[::-1] for code in EAN_R_CODES)
+EAN_PARITY = ('LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG',
+              'LGGLLG', 'LGGGLL', 'LGLGLG', 'LGLGGL', 'LGGLGL')
+EAN_QUIET_MODULES = 9
+
+
+# The live camera
+class DeviceSource:
+    fps = None
+
+    def __init__(self, device_index=0, width=320, height=240):
+        import cv2
+
+        self._capture = cv2.VideoCapture(device_index)
+        self._capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self._capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+    def read(self):
+        return self._capture.read()
+
+    def release(self):
+        self._capture.release()
+
+
+# A recorded video file, replayed at the rate it was recorded at
+class VideoFileSource:
+    def __init__(self, path, loop=False):
+        import cv2
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Video file not found: {path}")
+        self.path = path
+        self.loop = loop
+        self._capture = cv2.VideoCapture(path)
+        self.fps = self._capture.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def read(self):
+        import cv2
+
+        ret, image = self._capture.read()
+        if not ret and self.loop:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, image = self._capture.read()
+        return ret, image
+
+    def release(self):
+        self._capture.release()
+
+
+# Every image in a directory, in name order, shown as one frame each
+class ImageDirectorySource:
+    def __init__(self, path, fps=10.0, loop=False):
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"Image directory not found: {path}")
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.fps = fps
+        self.loop = loop
+        self._index = 0
+
+    def read(self):
+        import cv2
+
+        while True:
+            if self._index >= len(self.paths):
+                if not self.loop or not self.paths:
+                    return False, None
+                self._index = 0
+            path = self.paths[self._index]
+            self._index += 1
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is not None:
+                return True, image
+            print(f"Skipping unreadable image {path}")
+
+    def release(self):
+        pass
+
+
+def ean13_check_digit(data):
+    total = sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(data))
+    return str((10 - total % 10) % 10)
+
+
+# TEAM (4 digits) + YEAR (4) + NUMBER (3) plus the check digit: the 12-digit
+# UPC-A the battery labels carry, e.g. 12942024001 for battery 001. The
+# scanner drops the check digit again.
+def battery_barcode(team_number, purchase_year, battery_number):
+    data = f"{int(team_number):04d}{int(purchase_year):04d}{int(battery_number):03d}"
+    return data + ean13_check_digit('0' + data)
+
+
+# The 95 bar/space modules of an EAN-13 symbol as a string of '1' and '0'. A
+# 12-digit UPC-A code is drawn as the EAN-13 code with a leading 0.
+def ean13_modules(code):
+    if len(code) == 12:
+        code = '0' + code
+    if len(code) != 13 or not code.isdigit():
+        raise ValueError(f"EAN-13 needs 13 digits, got {code!r}")
+    parity = EAN_PARITY[int(code[0])]
+    left = ''.join((EAN_L_CODES if side == 'L' else EAN_G_CODES)[int(digit)]
+                   for side, digit in zip(parity, code[1:7]))
+    right = ''.join(EAN_R_CODES[int(digit)] for digit in code[7:])
+    return '101' + left + '01010' + right + '101'
+
+
+# Draws battery barcodes into camera-sized frames: each code is held for
+# hold_frames, followed by gap_frames of empty background, like labels being
+# held up to the camera one after another. `label` is the code on the frame
+# last returned by read() (None on a gap), so benchmarks can check what the
+# scanner should have seen.
+class SyntheticBarcodeSource:
+    def __init__(self, codes, fps=30.0, width=320, height=240, hold_frames=6, gap_frames=6, module_width=2,
+                 loop=False):
+        import numpy as np
+
+        self.codes = list(codes)
+        self.fps = fps
+        self.hold_frames = hold_frames
+        self.gap_frames = gap_frames
+        self.loop = loop
+        self.label = None
+        self.frames_generated = 0
+        self._blank = np.full((height, width, 3), 255, dtype=np.uint8)
+        self._images = [self._render(code, module_width) for code in self.codes]
+        self._index = 0
+        self._frame_in_cycle = 0
+
+    def _render(self, code, module_width):
+        modules = ean13_modules(code)
+        image = self._blank.copy()
+        height, width = image.shape[:2]
+        symbol_width = (len(modules) + 2 * EAN_QUIET_MODULES) * module_width
+        if symbol_width > width:
+            raise ValueError(f"Barcode is {symbol_width}px wide, frame is only {width}px")
+        left = (width - len(modules) * module_width) // 2
+        top, bottom = height // 4, height * 3 // 4
+        for position, bit in enumerate(modules):
+            if bit == '1':
+                x = left + position * module_width
+                image[top:bottom, x:x + module_width] = 0
+        return image
+
+    def read(self):
+        if self._index >= len(self.codes):
+            if not self.loop or not self.codes:
+                self.label = None
+                return False, None
+            self._index = 0
+
+        if self._frame_in_cycle < self.hold_frames:
+            self.label = self.codes[self._index]
+            image = self._images[self._index]
+        else:
+            self.label = None
+            image = self._blank
+        self._frame_in_cycle += 1
+        if self._frame_in_cycle >= self.hold_frames + self.gap_frames:
+            self._frame_in_cycle = 0
+            self._index += 1
+        self.frames_generated += 1
+        # Consumers may keep frames around, so never hand out the shared buffer
+        return True, image.copy()
+
+    def release(self):
+        pass
+
+
+# Sleeps between frames so a recorded source plays back at `fps`. With fps
+# None (live device, or unpaced replay) wait() returns immediately. If the
+# reader falls behind, the schedule restarts instead of bursting to catch up.
+class Pacer:
+    def __init__(self, fps=None):
+        self.interval = 1.0 / fps if fps else None
+        self._next_due = None
+
+    def wait(self, stop_event=None):
+        if self.interval is None:
+            return
+        now = time.monotonic()
+        if self._next_due is None or self._next_due < now:
+            self._next_due = now
+        delay = self._next_due - now
+        if delay > 0:
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+        self._next_due += self.interval
+
+
+# Build a source from the frame_source settings
+def open_source(kind='device', path='', width=320, height=240, device_index=0, codes=(), loop=False):
+    if kind == 'device':
+        return DeviceSource(device_index, width, height)
+    if kind == 'video':
+        return VideoFileSource(path, loop=loop)
+    if kind == 'images':
+        return ImageDirectorySource(path, loop=loop)
+    if kind == 'synthetic':
+        return SyntheticBarcodeSource(codes, width=width, height=height, loop=loop)
+    raise ValueError(f"Unknown frame source {kind!r}, expected one of {SOURCE_KINDS}")
@@ -0,0 +1,69 @@
+import gzip
+import os
+import threading
+
+# Bodies smaller than this are sent as-is; gzip would barely help
+GZIP_MIN_SIZE = 1024
+
+# Versions restart at zero with the process, so every ETag also carries a
+# token that is unique to this run
+BOOT_TOKEN = os.urandom(4).hex()
+
+
+# One encoded body for a named resource at one state version, plus its
+# gzipped form once a client has asked for it
+class EncodedBody:
+    __slots__ = ('key', 'etag', 'body', '_gzipped', '_lock')
+
+    def __init__(self, name, key, body):
+        self.key = key
+        self.etag = f'"{BOOT_TOKEN}-{name}-' + '-'.join(str(part) for part in key) + '"'
+        self.body = body
+        self._gzipped = None
+        self._lock = threading.Lock()
+
+    def gzipped(self):
+        with self._lock:
+            if self._gzipped is None:
+                self._gzipped = gzip.compress(self.body, compresslevel=6)
+            return self._gzipped
+
+
+# Keeps the latest encoding of each resource. build() only runs when the
+# version key changed, so any number of pollers share one encode.
+class VersionedBodyCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.not_modified = 0
+        self.gzip_responses = 0
+
+    def get(self, name, key, build):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.key == key:
+                self.hits += 1
+                return entry
+        # Build outside the lock; if two requests race, both results are equal
+        entry = EncodedBody(name, key, build())
+        with self._lock:
+            self._entries[name] = entry
+            self.builds += 1
+        return entry
+
+    def record_response(self, not_modified=False, gzipped=False):
+        with self._lock:
+            self.not_modified += not_modified
+            self.gzip_responses += gzipped
+
+    def stats(self):
+        with self._lock:
+            return {
+                'resources': len(self._entries),
+                'hits': self.hits,
+                'builds': self.builds,
+                'not_modified': self.not_modified,
+                'gzip_responses': self.gzip_responses
+            }
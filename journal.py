@@ -0,0 +1,224 @@
+import json
+import os
+import queue
+import threading
+import time
+
+
+# Append-only journal of battery state changes, written next to the
+# battery_status.json checkpoint. Every change is one JSON line:
+#   {"op": "put", "code": ..., "data": {...}}   full record after the change
+#   {"op": "del", "code": ...}
+# Records are whole, so replaying a line twice is harmless. A writer thread
+# appends whatever queued up within flush_interval and fsyncs it as one batch.
+# checkpoint() hands the writer a full snapshot; it atomically replaces the
+# checkpoint file and then empties the journal, so recovery only ever replays
+# changes made since the last checkpoint.
+#
+# A failed write (disk full, say) is reported and kept in `error` until a
+# write succeeds again. The writer keeps running: entries that did not make it
+# are cut back off the file and retried with the next batch, and a failed
+# checkpoint leaves the journal as it was, so nothing acknowledged is lost.
+class StateJournal:
+    def __init__(self, path, checkpoint_path, flush_interval=0.05, fsync=True, max_batch=500):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_batch = max_batch
+
+        self.entries_written = 0
+        self.entries_since_checkpoint = 0
+        self.commits = 0
+        self.checkpoints = 0
+        self.last_checkpoint_seconds = 0.0
+        self.error = None
+        self.failures = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._file = None
+        self._unwritten = []
+
+    # Checkpoint plus every journal entry after it, as {code: serialized record}
+    def recover(self):
+        state = {}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r') as f:
+                state = json.load(f)
+
+        replayed = 0
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # Torn last line from a crash; it was never acknowledged
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if entry['op'] == 'put':
+                        state[entry['code']] = entry['data']
+                    elif entry['op'] == 'del':
+                        state.pop(entry['code'], None)
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        self.entries_since_checkpoint = replayed
+        if replayed:
+            print(f"Replayed {replayed} journal entries from {self.path}")
+        return state
+
+    def start(self):
+        if self._thread is not None:
+            return
+        # Unbuffered, so a failed write leaves nothing behind to retry by itself
+        self._file = open(self.path, 'ab', buffering=0)
+        self._thread = threading.Thread(target=self._run, name='state-journal', daemon=True)
+        self._thread.start()
+
+    def put(self, code, data):
+        self._queue.put(('entry', json.dumps({'op': 'put', 'code': code, 'data': data})))
+
+    def delete(self, code):
+        self._queue.put(('entry', json.dumps({'op': 'del', 'code': code})))
+
+    # snapshot must be taken in the same critical section as the changes it
+    # covers, so nothing queued after it is older than it
+    def checkpoint(self, snapshot):
+        if self._thread is None:
+            self._write_checkpoint(snapshot)
+            return
+        self._queue.put(('checkpoint', snapshot))
+
+    # Block until everything queued so far is on disk; False if it is not
+    def flush(self, timeout=None):
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        return done.wait(timeout) and self.error is None
+
+    def stop(self, timeout=5):
+        if self._thread is None:
+            return
+        self._queue.put(('stop', None))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        try:
+            running = True
+            while running:
+                operations = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while operations[-1][0] == 'entry' and len(operations) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        operations.append(self._queue.get(timeout=remaining) if remaining > 0
+                                          else self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                lines = []
+                waiters = []
+                for kind, item in operations:
+                    if kind == 'entry':
+                        lines.append(item)
+                        continue
+                    # Everything before a checkpoint or flush must be durable first
+                    self._append(lines)
+                    lines = []
+                    if kind == 'checkpoint':
+                        self._checkpoint(item)
+                    elif kind == 'flush':
+                        waiters.append(item)
+                    elif kind == 'stop':
+                        running = False
+                self._append(lines)
+                for waiter in waiters:
+                    waiter.set()
+        finally:
+            self._file.close()
+
+    def _failed(self, action, e):
+        self.error = f"{action}: {e}"
+        self.failures += 1
+        print(f"State journal {action} failed: {e}")
+
+    def _append(self, lines):
+        lines = self._unwritten + lines
+        if not lines:
+            return
+        data = ''.join(line + '\n' for line in lines).encode('utf-8')
+        size = os.fstat(self._file.fileno()).st_size
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[self._file.write(view):]
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except OSError as e:
+            # Cut off whatever part of the batch got in, so the journal never
+            # holds a torn line in the middle, and try again next time
+            self._unwritten = lines
+            self._failed('append', e)
+            try:
+                os.ftruncate(self._file.fileno(), size)
+            except OSError:
+                pass
+            return
+        self._unwritten = []
+        self.error = None
+        self.entries_written += len(lines)
+        self.entries_since_checkpoint += len(lines)
+        self.commits += 1
+
+    def _checkpoint(self, snapshot):
+        try:
+            self._write_checkpoint(snapshot)
+        except Exception as e:
+            # The journal was left alone, so recovery still has every change
+            self._failed('checkpoint', e)
+            return
+        # The snapshot already holds any entries that could not be appended
+        self._unwritten = []
+        self.error = None
+
+    def _write_checkpoint(self, snapshot):
+        started = time.perf_counter()
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+
+        # The checkpoint now holds everything journalled so far. If we crash
+        # before the truncate, replaying the old entries on top of it is a no-op.
+        if self._file is not None:
+            self._file.truncate(0)
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        elif os.path.exists(self.path):
+            open(self.path, 'w').close()
+
+        self.entries_since_checkpoint = 0
+        self.checkpoints += 1
+        self.last_checkpoint_seconds = time.perf_counter() - started
+
+    def stats(self):
+        return {
+            'entries_written': self.entries_written,
+            'entries_since_checkpoint': self.entries_since_checkpoint,
+            'commits': self.commits,
+            'checkpoints': self.checkpoints,
+            'last_checkpoint_seconds': self.last_checkpoint_seconds,
+            'pending': self._queue.qsize(),
+            'unwritten': len(self._unwritten),
+            'failures': self.failures,
+            'error': self.error
+        }
@@ -0,0 +1,50 @@
+import threading
+import time
+
+
+# Shutdown steps in the order they were added: stop the producers first, then
+# the threads that consume them, then write the state out. Every step runs
+# even if an earlier one failed, and running the hooks twice (SIGTERM while
+# /stop is already shutting down) only runs them once.
+class ShutdownHooks:
+    def __init__(self):
+        self._hooks = []
+        self._results = []
+        self._lock = threading.Lock()
+        self._done = False
+
+    def add(self, name, hook):
+        self._hooks.append((name, hook))
+
+    def run(self):
+        with self._lock:
+            if self._done:
+                return False
+            self._done = True
+        for name, hook in self._hooks:
+            started = time.perf_counter()
+            error = None
+            try:
+                hook()
+            except Exception as e:
+                error = str(e)
+                print(f"Shutdown step {name} failed: {e}")
+            self._results.append({'name': name, 'seconds': round(time.perf_counter() - started, 4),
+                                  'error': error})
+        return True
+
+    # One line per step, for the console
+    def report(self):
+        lines = [f"  {result['name']:<20} {result['seconds'] * 1000:8.1f} ms"
+                 f"{'  FAILED: ' + result['error'] if result['error'] else ''}"
+                 for result in self._results]
+        return "Shutdown timing:\n" + "\n".join(lines)
+
+
+# Join a thread, saying so if it did not finish in time
+def join_thread(thread, timeout):
+    if thread is None:
+        return
+    thread.join(timeout)
+    if thread.is_alive():
+        print(f"Thread {thread.name} did not stop within {timeout} s")
@@ -0,0 +1,154 @@
+import csv
+import os
+import threading
+import zlib
+
+
+# Sidecar format; a sidecar written in another format is rebuilt
+INDEX_FORMAT = 2
+
+
+# Persistent secondary index over the CSV log: battery code -> byte offset and
+# length of each of its rows. The index lives in an append-only sidecar file
+# (one "code,offset,length,crc" line per row) and is extended by the log writer
+# as it commits, so reading one battery's history only touches that battery's
+# rows instead of the whole log.
+#
+# The sidecar starts with a checksum of the log header, and on load the last
+# row it points at must still be in the log with the same CRC. A log that was
+# rewritten or rotated under the same header fails that check and is
+# reindexed.
+class LogIndex:
+    def __init__(self, path, index_path=None, key_column=1):
+        self.path = path
+        self.index_path = index_path or path + '.idx'
+        self.key_column = key_column
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._indexed_upto = 0
+        self._last_entry = None
+        self._header = b''
+        self._index_file = None
+
+    # Load the sidecar, rebuilding it if it does not match the log, then index
+    # any rows appended while nothing was maintaining it
+    def load(self):
+        with self._lock:
+            self._entries = {}
+            self._indexed_upto = 0
+            self._last_entry = None
+            self._header = self._read_log_header()
+            checksum = f"#{INDEX_FORMAT},{zlib.crc32(self._header)}\n"
+
+            if not self._load_sidecar(checksum):
+                print(f"Rebuilding log index {self.index_path}")
+                self._entries = {}
+                self._last_entry = None
+                self._indexed_upto = len(self._header)
+                with open(self.index_path, 'w') as f:
+                    f.write(checksum)
+
+            self._index_file = open(self.index_path, 'a')
+            self._catch_up()
+
+    def close(self):
+        with self._lock:
+            if self._index_file is not None:
+                self._index_file.close()
+                self._index_file = None
+
+    def _read_log_header(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return f.readline()
+        except FileNotFoundError:
+            return b''
+
+    def _load_sidecar(self, checksum):
+        try:
+            with open(self.index_path, 'r') as f:
+                if f.readline() != checksum:
+                    return False
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # Torn last line from a crash; the catch-up redoes it
+                    code, offset, length, crc = line.rstrip('\n').rsplit(',', 3)
+                    self._add(code, int(offset), int(length), int(crc))
+        except (FileNotFoundError, ValueError):
+            return False
+
+        # The log must still contain everything the index points at, and the
+        # last row it points at must be the same one
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if self._indexed_upto > size:
+            return False
+        if self._last_entry is not None:
+            offset, length, crc = self._last_entry
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                if zlib.crc32(f.read(length)) != crc:
+                    return False
+        self._indexed_upto = max(self._indexed_upto, len(self._header))
+        return True
+
+    def _catch_up(self):
+        if not os.path.exists(self.path):
+            return
+        new_entries = []
+        with open(self.path, 'rb') as f:
+            f.seek(self._indexed_upto)
+            offset = self._indexed_upto
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                new_entries.append((self._key_of(line), offset, len(line), zlib.crc32(line)))
+                offset += len(line)
+        self._append(new_entries)
+
+    def _key_of(self, line):
+        row = next(csv.reader([line.decode('utf-8')]), [])
+        return row[self.key_column] if len(row) > self.key_column else ''
+
+    def _add(self, code, offset, length, crc):
+        self._entries.setdefault(code, []).append((offset, length))
+        if offset + length > self._indexed_upto:
+            self._indexed_upto = offset + length
+            self._last_entry = (offset, length, crc)
+
+    def _append(self, entries):
+        if not entries:
+            return
+        for entry in entries:
+            self._add(*entry)
+        if self._index_file is not None:
+            self._index_file.write(''.join(f"{code},{offset},{length},{crc}\n"
+                                           for code, offset, length, crc in entries))
+            self._index_file.flush()
+
+    # LogWriter on_commit hook: record the rows it just appended
+    def record_commit(self, committed):
+        entries = [(str(row[self.key_column]), offset, length, crc) for row, offset, length, crc in committed]
+        with self._lock:
+            # Rows written before load() will be picked up by its catch-up
+            if self._index_file is None:
+                return
+            self._append([entry for entry in entries if entry[1] >= self._indexed_upto])
+
+    # (offset, length) of every row for this battery, oldest first
+    def entries(self, code):
+        with self._lock:
+            return list(self._entries.get(code, ()))
+
+    # Return the log header followed by only this battery's rows, as bytes
+    def read_rows(self, code):
+        with self._lock:
+            entries = list(self._entries.get(code, ()))
+            header = self._header
+        if not entries:
+            return header
+        chunks = [header]
+        with open(self.path, 'rb') as f:
+            for offset, length in entries:
+                f.seek(offset)
+                chunks.append(f.read(length))
+        return b''.join(chunks)
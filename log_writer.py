@@ -0,0 +1,185 @@
+import csv
+import io
+import os
+import queue
+import threading
+import time
+import zlib
+
+from metrics import Histogram
+
+FSYNC_POLICIES = ('none', 'interval', 'every-commit')
+
+
+# Appends rows to the CSV log from a dedicated thread. Callers only put rows on
+# an in-memory queue; the writer keeps the file open and commits whatever has
+# queued up within flush_interval as one batch. on_commit, if given, is called
+# from the writer thread with (row, offset, length, crc32 of the row's bytes)
+# for every row committed.
+class LogWriter:
+    def __init__(self, path, header, flush_interval=0.5, fsync_policy='interval', fsync_interval=5.0,
+                 max_batch=500, on_commit=None):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync_policy!r}, expected one of {FSYNC_POLICIES}")
+        self.path = path
+        self.header = header
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.max_batch = max_batch
+        self.on_commit = on_commit
+
+        self.rows_written = 0
+        self.commits = 0
+        # Time to write, flush and (when due) fsync one batch
+        self.commit_latency = Histogram()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._file = None
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, row):
+        self._queue.put(('row', row))
+
+    # Block until every row queued so far is on disk (and fsynced)
+    def flush(self, timeout=None):
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        return done.wait(timeout)
+
+    # Flush everything that is queued and close the file
+    def stop(self, timeout=5):
+        if self._thread is None:
+            return
+        self._queue.put(('stop', None))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def pending(self):
+        return self._queue.qsize()
+
+    # Rows are encoded here and written as bytes so the exact offset of every
+    # row is known
+    def _encode(self, row):
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._writer.writerow(row)
+        return self._buffer.getvalue().encode('utf-8')
+
+    def _open(self):
+        needs_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, mode='ab')
+        if needs_header:
+            self._file.write(self._encode(self.header))
+            self._file.flush()
+
+    def _run(self):
+        self._open()
+        try:
+            running = True
+            while running:
+                try:
+                    # Under the interval policy, make sure the tail of a burst
+                    # still gets synced once things go quiet
+                    timeout = self.fsync_interval if self._unsynced else None
+                    kind, item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    self._sync()
+                    continue
+                batch = []
+                waiters = []
+                deadline = time.monotonic() + self.flush_interval
+
+                # Group everything that arrives within the flush interval into
+                # one commit; flush and stop requests commit immediately
+                while True:
+                    if kind == 'row':
+                        batch.append(item)
+                    elif kind == 'flush':
+                        waiters.append(item)
+                        break
+                    elif kind == 'stop':
+                        running = False
+                        break
+                    if len(batch) >= self.max_batch:
+                        break
+                    remaining = deadline - time.monotonic()
+                    try:
+                        kind, item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                # Whatever is still queued when asked to stop goes in too
+                if not running:
+                    rows, drained_waiters = self._drain()
+                    batch.extend(rows)
+                    waiters.extend(drained_waiters)
+
+                self._commit(batch, force_sync=bool(waiters) or not running)
+                for waiter in waiters:
+                    waiter.set()
+        finally:
+            self._file.close()
+
+    def _drain(self):
+        rows = []
+        waiters = []
+        while True:
+            try:
+                kind, item = self._queue.get_nowait()
+            except queue.Empty:
+                return rows, waiters
+            if kind == 'row':
+                rows.append(item)
+            elif kind == 'flush':
+                waiters.append(item)
+
+    def _commit(self, rows, force_sync=False):
+        started = time.perf_counter()
+        self._write_batch(rows, force_sync)
+        if rows:
+            self.commit_latency.observe(time.perf_counter() - started)
+
+    def _write_batch(self, rows, force_sync):
+        if rows:
+            offset = self._file.tell()
+            committed = []
+            chunks = []
+            for row in rows:
+                data = self._encode(row)
+                committed.append((row, offset, len(data), zlib.crc32(data)))
+                chunks.append(data)
+                offset += len(data)
+            self._file.write(b''.join(chunks))
+            self.rows_written += len(rows)
+            self.commits += 1
+            self._unsynced = self.fsync_policy != 'none'
+        self._file.flush()
+
+        if rows and self.on_commit is not None:
+            try:
+                self.on_commit(committed)
+            except Exception as e:
+                print(f"Error in log commit callback: {e}")
+
+        if not self._unsynced:
+            return
+        if self.fsync_policy == 'every-commit' or force_sync or \
+                time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
@@ -1,61 +1,197 @@
-import cv2
 import time
-import csv
 import threading
-from pyzbar.pyzbar import decode
+from startup import StartupTimer
+
+# Created before anything heavy is imported, so the breakdown covers imports
+startup_timer = StartupTimer()
+
 from datetime import datetime, timedelta
-from flask import Flask, render_template, redirect, url_for, request, flash, jsonify, Response
+from flask import Flask, render_template, stream_template, redirect, url_for, request, flash, jsonify, Response, g
+import hmac
 import json
 import os
-import pygame
-import pandas as pd
-import plotly
-import plotly.express as px
-
-pygame.mixer.init()
-cap = cv2.VideoCapture(0)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 320)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 240)
+import queue
+import signal
+from battery import BatteryRecord, Status, STATUS_LABELS, NEXT_STATUS, ADVANCED_INPUT_STATUSES, format_timestamp
+from capture import FrameProducer
+from events import EventBroadcaster
+from figures import FigureCache, downsample
+from fleet import FleetUsage
+from frame_sources import open_source, battery_barcode
+from http_cache import VersionedBodyCache, GZIP_MIN_SIZE, BOOT_TOKEN
+from lifecycle import ShutdownHooks, join_thread
+from metrics import InstrumentedLock, PrometheusText, RouteMetrics
+from mjpeg import stream_params
+from profiler import SamplingProfiler, MAX_PROFILE_SECONDS, DEFAULT_PROFILE_SECONDS
+from pipeline import ScanPipeline, TransitionEvent, PendingEvent, CoalescedBeeper, SCAN_DEDUPE_INTERVAL
+from scheduler import DeadlineScheduler
+from serving import PooledWSGIServer
+from snapshot import FleetSnapshot, battery_view
+from stations import ScanStation, StationRegistry
+from storage import create_storage
+
+# The camera (OpenCV, pyzbar), audio (pygame) and analytics (pandas, plotly)
+# stacks are imported where they are first used, so importing this module
+# needs no camera or sound card. start_background_services() brings up the
+# camera and audio once the server is listening.
+
+# The capture thread is the only reader of the camera; the scanner and the
+# video feed subscribe to the frames it publishes. This is the producer of the
+# built-in 'main' station.
+camera = FrameProducer(device_index=0, width=320, height=240, open_source=lambda: open_frame_source(), name='main')
 # Define the path for persistent data storage
 PERSISTENT_FILE = 'battery_status.json'
 stop_flag = threading.Event()  # Create an Event object to signal threads to stop
 
+# Production server (see serving.py): SERVER_THREADS workers for ordinary
+# requests, and a thread per open stream (STREAMING_PATHS) up to
+# SERVER_MAX_STREAMS. Every dashboard tab holds two streams, events and video.
+# Idle connections are kept alive for SERVER_KEEPALIVE_TIMEOUT without
+# holding a worker.
+# On SIGTERM, SIGINT or /stop the server stops accepting, waits up to
+# SERVER_DRAIN_TIMEOUT for requests in flight, then shutdown_hooks stop the
+# threads and save the state.
+SERVER_HOST = '0.0.0.0'
+SERVER_PORT = 5000
+SERVER_THREADS = 16
+SERVER_MAX_STREAMS = 64
+SERVER_REQUEST_TIMEOUT = 5  # seconds
+SERVER_KEEPALIVE_TIMEOUT = 15  # seconds
+SERVER_DRAIN_TIMEOUT = 10  # seconds
+STREAMING_PATHS = ('/api/events', '/video_feed')
+THREAD_STOP_TIMEOUT = 5  # seconds
+shutdown_requested = threading.Event()
+shutdown_hooks = ShutdownHooks()
+http_server = None
+cooldown_thread = None
+checkpoint_thread = None
+
 app = Flask(__name__)
 app.secret_key = os.urandom(12)
+# Latency and response size of every route, exported at /metrics
+route_metrics = RouteMetrics()
+
+# Admin-only endpoints (/admin/profile, ?profile=1) accept requests carrying
+# this token in X-Admin-Token or ?token=, or, while it is empty, requests from
+# this machine only
+ADMIN_TOKEN = ''
+# Only one whole-process profile runs at a time
+profile_lock = threading.Lock()
 
 # Define team number default
 TEAM_NUMBER = "1294"
-# Create a lock for thread safety
-battery_status_lock = threading.Lock()
+# Create a lock for thread safety. Only writers need it: readers use the
+# published fleet_snapshot. It records wait and hold time histograms.
+battery_status_lock = InstrumentedLock('battery_status')
 
 COOLDOWN_DURATION_TIME = 600  # seconds
 
 ADVANCED_LOGGING = True  # Default is on
 
+# Usage outliers: 'delta' flags usage at least USAGE_OUTLIER_THRESHOLD uses
+# away from the fleet average, 'zscore' at least that many standard deviations
+USAGE_OUTLIER_RULE = 'delta'
+USAGE_OUTLIER_THRESHOLD = 2
+
+# Pre-decode gate: fraction of pixels that must change before a frame is decoded,
+# and the scale applied to the changed region before it is handed to pyzbar
+DECODE_MOTION_THRESHOLD = 0.002
+DECODE_DOWNSCALE = 1.0
+
+# Decode mode: 'thread' decodes on the scanner thread, 'process' hands frames
+# to a pool of worker processes through shared memory
+DECODE_MODE = 'thread'
+DECODE_WORKERS = 2
+DECODE_QUEUE_DEPTH = 4
+
+# Where frames come from: 'device' (the camera), 'video' (a recorded file),
+# 'images' (a directory of stills) or 'synthetic' (generated battery
+# barcodes). Recorded sources replay in real time when paced, or as fast as
+# possible otherwise.
+FRAME_SOURCE = 'device'
+FRAME_SOURCE_PATH = ''
+FRAME_SOURCE_PACED = True
+FRAME_SOURCE_LOOP = False
+SYNTHETIC_BATTERY_COUNT = 10
+
+# Scan stations: the built-in 'main' station reads `camera` with the settings
+# above; STATIONS adds more, e.g. {"name": "robot_cart", "source": "device",
+# "device_index": 1}. Missing keys fall back to the frame_source settings.
+# Every station feeds the one scan pipeline, so deduplication is shared.
+STATIONS = []
+stations = StationRegistry()
+
+# /video_feed defaults; clients can ask for other values per connection
+VIDEO_FEED_FPS = 15
+VIDEO_FEED_MAX_FPS = 30
+VIDEO_FEED_QUALITY = 70
+
 # Battery status tracking dictionary
 battery_status = {}
+# Running usage aggregates over battery_status; guarded by battery_status_lock too
+fleet_usage = FleetUsage()
+# Immutable, versioned copy of battery_status for readers; replaced (never
+# modified) by publish_snapshot(). The last STATE_CHANGE_LOG_SIZE versions
+# are remembered for /api/battery_status?since=<version>.
+STATE_CHANGE_LOG_SIZE = 256
+fleet_snapshot = FleetSnapshot()
 # List to keep track of pending batteries that are scanned but not in the system
 pending_batteries = []
+# Bumped whenever pending_batteries changes (under battery_status_lock)
+pending_version = 0
 
 SETTINGS_FILE = 'settings.json'
 
-
-# Initialize the CSV file and write headers if it doesn’t exist
-def initialize_csv():
-    if not os.path.exists('battery_log.csv'):
-        with open('battery_log.csv', mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([
-                'Timestamp',
-                'Battery Code',
-                'Team Number',
-                'Purchase Year',
-                'Battery Number',
-                'Status',
-                'Current Usage (J)',
-                'Battery Feel',
-                'Charged mAh'
-            ])
+LOG_FILE = 'battery_log.csv'
+SQLITE_FILE = 'battery_log.db'
+
+# Storage backend: 'json' keeps state in PERSISTENT_FILE and history in LOG_FILE,
+# 'sqlite' keeps both in SQLITE_FILE
+STORAGE_BACKEND = 'json'
+storage = None
+
+# Group-commit settings for the log writer. fsync policy is one of
+# 'none', 'interval' or 'every-commit'.
+LOG_FLUSH_INTERVAL = 0.5  # seconds
+LOG_FSYNC_POLICY = 'interval'
+LOG_FSYNC_INTERVAL = 5.0  # seconds
+
+# Battery state changes are journalled as they happen (fsynced in batches of
+# JOURNAL_FLUSH_INTERVAL) and compacted into PERSISTENT_FILE every
+# STATE_CHECKPOINT_INTERVAL, which bounds how much a restart has to replay
+JOURNAL_FLUSH_INTERVAL = 0.05  # seconds
+STATE_CHECKPOINT_INTERVAL = 60  # seconds
+
+# Rendered statistics graphs, keyed by (route, battery code, log version).
+# Each plotted series is reduced to at most FIGURE_POINT_BUDGET points.
+FIGURE_POINT_BUDGET = 1000
+FIGURE_CACHE_SIZE = 32
+figure_cache = FigureCache(max_entries=FIGURE_CACHE_SIZE)
+
+# Event log pages (/logs and /api/logs), newest first
+LOG_PAGE_SIZE = 50
+LOG_PAGE_MAX = 500
+
+# Encoded bodies of the polled JSON APIs, one per state version, served with
+# ETags and gzip
+api_body_cache = VersionedBodyCache()
+
+# Push channel for dashboard clients (/api/events)
+SSE_CLIENT_QUEUE_SIZE = 100
+SSE_KEEPALIVE_INTERVAL = 15  # seconds
+event_broadcaster = EventBroadcaster(max_queue_size=SSE_CLIENT_QUEUE_SIZE)
+
+# Scans go through a staged pipeline (see pipeline.py): the scanner only
+# enqueues, transitions are applied on their own thread, and the CSV log,
+# the beep and dashboard notifications are separate sinks
+SCAN_QUEUE_SIZE = 256
+BEEP_COALESCE_INTERVAL = 0.2  # seconds
+scanned_barcodes = {}  # code -> (time, station) of its last accepted scan
+# Scans dropped by the dedupe, split by whether the earlier scan came from the
+# same station or another one
+scan_duplicates = {'same_station': 0, 'cross_station': 0}
+scan_pipeline = None
+beeper = None
 
 
 # Parse battery code
@@ -71,181 +207,288 @@ def parse_battery_code(barcode_data):
     }
 
 
-# Log scan data to CSV
+# Log scan data to the event log. The row is only queued here; the storage
+# writer thread does the disk I/O, so this is safe to call with battery_status_lock held.
 def log_to_csv(barcode_data, battery_info, status):
-    initialize_csv()  # Ensure CSV is initialized
-    with open('battery_log.csv', mode='a', newline='') as file:
-        writer = csv.writer(file)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        writer.writerow([
-            timestamp,
-            barcode_data,
-            battery_info.get('team_number', ''),
-            battery_info.get('purchase_year', ''),
-            battery_info.get('battery_number', ''),
-            status,
-            battery_info.get('current_usage', ''),
-            battery_info.get('battery_feel', ''),
-            battery_info.get('charged_mAh', '')
-        ])
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    storage.append_event([
+        timestamp,
+        barcode_data,
+        battery_info.get('team_number', ''),
+        battery_info.get('purchase_year', ''),
+        battery_info.get('battery_number', ''),
+        status,
+        battery_info.get('current_usage', ''),
+        battery_info.get('battery_feel', ''),
+        battery_info.get('charged_mAh', '')
+    ])
+
+
+def open_storage():
+    global storage
+    storage = create_storage(STORAGE_BACKEND, PERSISTENT_FILE, LOG_FILE, SQLITE_FILE,
+                             flush_interval=LOG_FLUSH_INTERVAL, fsync_policy=LOG_FSYNC_POLICY,
+                             fsync_interval=LOG_FSYNC_INTERVAL, journal_flush_interval=JOURNAL_FLUSH_INTERVAL)
+    storage.open()
+    if STORAGE_BACKEND == 'sqlite':
+        # Bring in the JSON state and CSV history the first time the database is used
+        batteries, events = storage.import_legacy(PERSISTENT_FILE, LOG_FILE)
+        if batteries or events:
+            print(f"Imported {batteries} batteries and {events} log rows into {SQLITE_FILE}")
 
 
 # Update battery status with timestamp
-def update_battery_status(barcode_data, new_status):
-    battery_status[barcode_data]['status'] = new_status
-    battery_status[barcode_data]['display_time'] = timedelta(0)
-    battery_status[barcode_data]['last_change'] = datetime.now()
-    battery_status[barcode_data]['notes'] = battery_status[barcode_data].get('notes', '')
-    battery_status[barcode_data]['usage_count'] = battery_status[barcode_data].get('usage_count', 0)
-
-    if battery_status[barcode_data]['status'] == "In Use":
-        battery_status[barcode_data]['usage_count'] += 1
-
-    # Set the awaiting_advanced_input flag based on the new status
-    if ADVANCED_LOGGING and new_status in ["In Use", "Charging"]:
-        battery_status[barcode_data]['awaiting_advanced_input'] = True
-    else:
-        # Reset the flag if the status is not "In Use" or "Charging"
-        battery_status[barcode_data]['awaiting_advanced_input'] = False
+def update_battery_status(barcode_data, new_status, notify=True):
+    record = battery_status[barcode_data]
+    record.status = new_status
+    record.last_change = time.time()
 
+    if new_status == Status.IN_USE:
+        record.usage_count += 1
+        fleet_usage.update(barcode_data, record.usage_count - 1, record.usage_count)
 
-def calculate_average_usage():
-    with battery_status_lock:
-        total_usage = sum(battery['usage_count'] for battery in battery_status.values())
-        battery_count = len(battery_status)
-        if battery_count == 0:
-            return 0
-        average_usage = total_usage / battery_count
-        return average_usage
+    # Set the awaiting_advanced_input flag based on the new status; it is reset
+    # for any status other than "In Use" or "Charging"
+    record.awaiting_advanced_input = ADVANCED_LOGGING and new_status in ADVANCED_INPUT_STATUSES
 
+    schedule_cooldown(barcode_data)
+    persist_battery(barcode_data)
 
-def identify_usage_outliers():
-    average_usage = calculate_average_usage()
-    overused_batteries = []
-    underused_batteries = []
+    # Push the transition to connected dashboards (scans do this from the
+    # pipeline's notify sink instead)
+    if notify:
+        notify_transition(barcode_data, new_status, record.awaiting_advanced_input)
 
-    with battery_status_lock:
-        for code, data in battery_status.items():
-            usage_count = data['usage_count']
-            if usage_count >= average_usage + 2:
-                overused_batteries.append(code)
-            elif usage_count <= average_usage - 2:
-                underused_batteries.append(code)
 
-    return overused_batteries, underused_batteries
+def notify_transition(barcode_data, new_status, awaiting_input):
+    event_broadcaster.publish('battery_status', {'battery_code': barcode_data, 'status': new_status.label})
+    if awaiting_input:
+        event_broadcaster.publish('advanced_logging', {'battery_code': barcode_data, 'status': new_status.label})
+
+
+# Publish a new fleet snapshot in which only the given batteries are rebuilt.
+# Call with battery_status_lock held.
+def publish_snapshot(codes):
+    global fleet_snapshot
+    changes = {code: battery_view(code, battery_status[code]) if code in battery_status else None for code in codes}
+    overused, underused = fleet_usage.outliers(USAGE_OUTLIER_RULE, USAGE_OUTLIER_THRESHOLD)
+    fleet_snapshot = fleet_snapshot.evolve(changes, overused, underused, STATE_CHANGE_LOG_SIZE)
+
+
+# Store a battery after changing it and publish the change to readers. Call
+# with battery_status_lock held.
+def persist_battery(code):
+    storage.save_battery(code, battery_status[code])
+    publish_snapshot((code,))
+
+
+# Add or remove a battery, keeping the fleet aggregates in step. Call with
+# battery_status_lock held; added batteries are published by persist_battery.
+def add_battery_record(code, record):
+    battery_status[code] = record
+    fleet_usage.add(code, record.usage_count)
+
+
+def remove_battery_record(code):
+    record = battery_status.pop(code)
+    fleet_usage.remove(code, record.usage_count)
+    storage.delete_battery(code)
+    publish_snapshot((code,))
+    return record
+
+
+# How the outlier rule reads in the dashboard warnings
+def describe_outlier_rule(direction):
+    if USAGE_OUTLIER_RULE == 'zscore':
+        return f"{USAGE_OUTLIER_THRESHOLD} standard deviations {'above' if direction > 0 else 'below'} average"
+    return f"average {'+' if direction > 0 else '-'} {USAGE_OUTLIER_THRESHOLD}"
 
 
 def can_change_status(barcode_data, new_status):
     with battery_status_lock:
         if barcode_data in battery_status:
-            last_status = battery_status[barcode_data]['status']
-            last_change = battery_status[barcode_data]['last_change']
-
             # Logic to enforce allowed transitions
-            valid_transitions = {
-                "Charging": ["Cooldown To Robot"],
-                "Cooldown To Robot": ["Ready for ROBOT"],
-                "Ready for ROBOT": ["In Use"],
-                "In Use": ["Cooldown To Charge"],
-                "Cooldown To Charge": ["Ready for CHARGING"],
-                "Ready for CHARGING": ["Charging"]
-            }
-
-            if new_status in valid_transitions.get(last_status, []):
-                return True
-        else:
-            # Allow initialization to "Charging"
-            if new_status == "Charging":
-                return True
-    return False
+            return NEXT_STATUS[battery_status[barcode_data].status] == new_status
+        # Allow initialization to "Charging"
+        return new_status == Status.CHARGING
 
 
-# Barcode scanning function
-def scan_barcode():
-    print("Starting barcode scanning...")
-    scanned_barcodes = {}
-    cooldown_time = 2
+# Apply one scan: unknown batteries go on the pending list, repeats within
+# SCAN_DEDUPE_INTERVAL are ignored, anything else moves to its next status.
+# Runs on the pipeline's transitions thread and returns the events for the sinks.
+def apply_scan(event):
+    global pending_version
+    barcode_data = event.code[:-1]  # Discard last digit
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Failed to capture image")
-            break
+    # Parse the battery code
+    try:
+        battery_info = parse_battery_code(barcode_data)
+    except Exception as e:
+        print(f"Invalid barcode format: {barcode_data}")
+        return []
 
-        barcodes = decode(frame)
+    with battery_status_lock:
+        if barcode_data not in battery_status:
+            # Battery not in system, add to pending list
+            if barcode_data in pending_batteries:
+                return []
+            pending_batteries.append(barcode_data)
+            pending_version += 1
+            return [PendingEvent(barcode_data, event.decoded_at)]
+
+        last_scanned, last_station = scanned_barcodes.get(barcode_data, (None, None))
+        if last_scanned is not None and event.decoded_at - last_scanned <= SCAN_DEDUPE_INTERVAL:
+            scan_duplicates['same_station' if last_station == event.station else 'cross_station'] += 1
+            return []
+        scanned_barcodes[barcode_data] = (event.decoded_at, event.station)
+        print(f"Scanned Barcode: {barcode_data}" + (f" at {event.station}" if event.station else ""))
+
+        # Determine the next status based on current status
+        current_status = battery_status[barcode_data].status
+        new_status = get_next_status(barcode_data, current_status)
+        if new_status is None:
+            print(f"Battery {barcode_data} cannot change status yet.")
+            return []
+        update_battery_status(barcode_data, new_status, notify=False)
+        awaiting_input = battery_status[barcode_data].awaiting_advanced_input
+
+    return [TransitionEvent(barcode_data, battery_info, current_status, new_status, awaiting_input, time.time())]
+
+
+# Sink: one CSV row per transition unless the row is written after the
+# advanced logging prompt
+def audit_sink(event):
+    if isinstance(event, TransitionEvent) and not ADVANCED_LOGGING:
+        log_to_csv(event.code, event.battery_info, event.new_status.label)
+
+
+# Sink: push transitions and new pending batteries to dashboards
+def notify_sink(event):
+    if isinstance(event, TransitionEvent):
+        notify_transition(event.code, event.new_status, event.awaiting_input)
+    elif isinstance(event, PendingEvent):
+        event_broadcaster.publish('pending_battery', {'battery_code': event.code})
+
+
+# Initialise audio, load the beep once and start the pipeline
+def load_beep_sound():
+    import pygame
+
+    pygame.mixer.init()
+    return pygame.mixer.Sound("beep.wav")
+
+
+def start_scan_pipeline():
+    global scan_pipeline, beeper
+    # No pygame or no sound card only costs the beep
+    try:
+        sound = load_beep_sound()
+    except Exception as e:
+        print(f"Audio feedback disabled: {e}")
+        sound = None
+    beeper = CoalescedBeeper(sound, min_interval=BEEP_COALESCE_INTERVAL)
+    scan_pipeline = ScanPipeline(apply_scan, [
+        ('audit', audit_sink, False),
+        ('audio', beeper, True),
+        ('notify', notify_sink, False)
+    ], queue_size=SCAN_QUEUE_SIZE)
+    scan_pipeline.start()
+
+
+# Hand one decoded barcode to the pipeline. Called from each station's
+# thread, or its decode pool's collector thread in process mode.
+def submit_scan(code, decoded_at, station):
+    if scan_pipeline is None:
+        return False
+    return scan_pipeline.submit(code, decoded_at, station)
+
+
+# Open a station's frame source (called on its capture thread). config is
+# the station's entry in STATIONS, empty for the 'main' station.
+def open_frame_source(config=None):
+    config = config or {}
+    kind = config.get('source', FRAME_SOURCE)
+    path = config.get('path', FRAME_SOURCE_PATH)
+    codes = [battery_barcode(TEAM_NUMBER, datetime.now().year, number)
+             for number in range(1, SYNTHETIC_BATTERY_COUNT + 1)]
+    print(f"Station {config.get('name', 'main')} reading frames from {kind} source {path}".rstrip())
+    return open_source(kind, path, width=config.get('width', camera.width), height=config.get('height', camera.height),
+                       device_index=config.get('device_index', camera.device_index), codes=codes,
+                       loop=config.get('loop', FRAME_SOURCE_LOOP))
+
+
+# Build the station registry from the settings. Nothing is opened until the
+# stations are started.
+def configure_stations():
+    camera.paced = FRAME_SOURCE_PACED
+    producers = [('main', camera)]
+    for config in STATIONS:
+        producer = FrameProducer(device_index=config.get('device_index', 0), width=config.get('width', 320),
+                                 height=config.get('height', 240), paced=config.get('paced', FRAME_SOURCE_PACED),
+                                 open_source=lambda config=config: open_frame_source(config),
+                                 name=config.get('name', ''))
+        producers.append((config.get('name', ''), producer))
+
+    for name, producer in producers:
+        try:
+            stations.add(ScanStation(name, producer, submit_scan, decode_mode=DECODE_MODE, workers=DECODE_WORKERS,
+                                     queue_depth=DECODE_QUEUE_DEPTH, motion_threshold=DECODE_MOTION_THRESHOLD,
+                                     downscale=DECODE_DOWNSCALE))
+        except ValueError as e:
+            print(f"Skipping station: {e}")
+
+
+# Arm (or disarm) the cooldown deadline for a battery after its status changed
+def schedule_cooldown(barcode_data):
+    data = battery_status.get(barcode_data)
+    if data is not None and data.cooldown_target is not None:
+        cooldown_scheduler.schedule(barcode_data, data.last_change + COOLDOWN_DURATION_TIME)
+    else:
+        cooldown_scheduler.cancel(barcode_data)
 
-        for barcode in barcodes:
-            barcode_data = barcode.data.decode('utf-8')[:-1]  # Discard last digit
 
-            # Parse the battery code
-            try:
-                battery_info = parse_battery_code(barcode_data)
-            except Exception as e:
-                print(f"Invalid barcode format: {barcode_data}")
-                continue
-
-            with battery_status_lock:
-                if barcode_data not in battery_status:
-                    # Battery not in system, add to pending list
-                    if barcode_data not in pending_batteries:
-                        pending_batteries.append(barcode_data)
-                    continue  # Skip further processing
-
-            if barcode_data not in scanned_barcodes or time.time() - scanned_barcodes[barcode_data] > cooldown_time:
-                scanned_barcodes[barcode_data] = time.time()
-                print(f"Scanned Barcode: {barcode_data}")
-
-                with battery_status_lock:
-                    current_status = battery_status.get(barcode_data, {}).get('status', 'Charging')
-
-                # Determine the next status based on current status
-                new_status = get_next_status(barcode_data, current_status)
-                if new_status:
-                    if not ADVANCED_LOGGING:
-                        log_to_csv(barcode_data, battery_info, new_status)
-                    update_battery_status(barcode_data, new_status)
-                    pygame.mixer.music.load("beep.wav")
-                    pygame.mixer.music.play()
-                else:
-                    print(f"Battery {barcode_data} cannot change status yet.")
-        time.sleep(0.1)
-    cap.release()
+# Re-arm every cooldown, e.g. after the cooldown duration setting changed.
+# Every battery is republished since the cooldown timers moved.
+def reschedule_cooldowns():
+    with battery_status_lock:
+        for barcode_data in battery_status:
+            schedule_cooldown(barcode_data)
+        publish_snapshot(list(battery_status))
 
 
-# Background thread to auto-update cooldown statuses
-def auto_update_cooldown_statuses():
-    while True:
-        with battery_status_lock:
-            for barcode_data, data in battery_status.items():
-                status = data['status']
-                last_change = data['last_change']
-                current_time = datetime.now()
+# Called by the scheduler when a battery's cooldown deadline is reached
+def expire_cooldown(barcode_data):
+    with battery_status_lock:
+        data = battery_status.get(barcode_data)
+        if data is None or data.cooldown_target is None:
+            return
+        if time.time() < data.last_change + COOLDOWN_DURATION_TIME:
+            # The cooldown was extended since this deadline was armed
+            schedule_cooldown(barcode_data)
+            return
+        update_battery_status(barcode_data, data.cooldown_target)
 
-                if status in ["Cooldown To Robot", "Cooldown To Charge"]:
-                    # Calculate remaining cooldown time as a countdown timer
-                    elapsed_time = current_time - last_change
-                    display_time = max(timedelta(seconds=COOLDOWN_DURATION_TIME) - elapsed_time, timedelta(0))
-                    hours = int(display_time.total_seconds() // 3600)
-                    minutes = int((display_time.total_seconds() % 3600) // 60)
-                    seconds = int(display_time.total_seconds() % 60)
 
-                    battery_status[barcode_data]['display_time'] = f"{hours}:{minutes:02}:{seconds:02}"
+cooldown_scheduler = DeadlineScheduler(expire_cooldown)
 
-                    # If countdown reaches zero, change status to ready
-                    if display_time == timedelta(0):
-                        new_status = "Ready for ROBOT" if status == "Cooldown To Robot" else "Ready for CHARGING"
-                        update_battery_status(barcode_data, new_status)
 
-                else:
-                    # Show elapsed time as a timer going up
-                    elapsed_time = current_time - last_change
-                    hours = int(elapsed_time.total_seconds() // 3600)
-                    minutes = int((elapsed_time.total_seconds() % 3600) // 60)
-                    seconds = int(elapsed_time.total_seconds() % 60)
+# Background thread to auto-update cooldown statuses
+def auto_update_cooldown_statuses():
+    cooldown_scheduler.run()
 
-                    battery_status[barcode_data]['display_time'] = f"{hours}:{minutes:02}:{seconds:02}"
 
-        time.sleep(1)  # Check every second for countdown accuracy
+# Elapsed time since the last change, or the remaining countdown while the
+# battery is cooling down. Computed when read instead of stored on the record.
+def format_display_time(data, now=None):
+    elapsed_time = (now or time.time()) - data.last_change
+    if data.cooldown_target is not None:
+        display_time = max(COOLDOWN_DURATION_TIME - elapsed_time, 0)
+    else:
+        display_time = max(elapsed_time, 0)
+    hours = int(display_time // 3600)
+    minutes = int((display_time % 3600) // 60)
+    seconds = int(display_time % 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
 
 
 def format_battery_code(code):
@@ -255,16 +498,7 @@ def format_battery_code(code):
 
 def get_next_status(barcode_data, current_status):
     # Logic to enforce allowed transitions
-    valid_transitions = {
-        "Charging": "Cooldown To Robot",
-        "Cooldown To Robot": "Ready for ROBOT",
-        "Ready for ROBOT": "In Use",
-        "In Use": "Cooldown To Charge",
-        "Cooldown To Charge": "Ready for CHARGING",
-        "Ready for CHARGING": "Charging"
-    }
-
-    next_status = valid_transitions.get(current_status)
+    next_status = NEXT_STATUS[current_status]
 
     # Implement any cooldown checks or additional logic here if necessary
     # For simplicity, we'll assume the transition is allowed
@@ -274,94 +508,106 @@ def get_next_status(barcode_data, current_status):
 # Flask route to display battery statuses
 @app.route('/')
 def index():
-    average_usage = calculate_average_usage()
-    overused_batteries, underused_batteries = identify_usage_outliers()
-
-    with battery_status_lock:
-        battery_info = [
-            {
-                'battery_code': code,
-                'status': data['status'],
-                'display_time': str(data.get('display_time', '00:00:00')),
-                'last_change': data['last_change'].strftime("%Y-%m-%d %H:%M:%S"),
-                'usage_count': data.get('usage_count', 0),
-                'notes': data.get('notes', '')
-            }
-            for code, data in battery_status.items()
-        ]
+    snapshot = fleet_snapshot
+    overused_batteries, underused_batteries = snapshot.overused, snapshot.underused
+    now = time.time()
+    battery_info = [
+        {
+            'battery_code': code,
+            'status': data.status.label,
+            'display_time': format_display_time(data, now),
+            'last_change': format_timestamp(data.last_change),
+            'usage_count': data.usage_count,
+            'notes': data.notes
+        }
+        for code, data in snapshot.batteries.items()
+    ]
 
     # Display warnings
     if overused_batteries:
         overused_list = ', '.join(format_battery_code(code) for code in overused_batteries)
-        flash(f'The following batteries are overused (usage more than average + 2): {overused_list}', 'warning')
+        flash(f'The following batteries are overused (usage more than {describe_outlier_rule(1)}): {overused_list}',
+              'warning')
 
     if underused_batteries:
         underused_list = ', '.join(format_battery_code(code) for code in underused_batteries)
-        flash(f'The following batteries are underused (usage less than average - 2): {underused_list}', 'warning')
+        flash(f'The following batteries are underused (usage less than {describe_outlier_rule(-1)}): '
+              f'{underused_list}', 'warning')
 
     return render_template('index.html', batteries=battery_info, format_battery_code=format_battery_code)
 
 
 @app.route('/statistics')
 def statistics():
-    # Load the battery log data
-    df = pd.read_csv('battery_log.csv')
+    # Graphs only change when the log does, so serve them from the cache
+    # until a new entry is written
+    cache_key = ('statistics', None, storage.log_version())
+    graphs = figure_cache.get(cache_key)
+    if graphs is None:
+        # Load the battery log data (timestamps are already parsed by the storage)
+        df = storage.events_frame()
+
+        if df.empty:
+            flash("No data available for statistics.", "warning")
+            return redirect(url_for('index'))
 
-    if df.empty:
-        flash("No data available for statistics.", "warning")
-        return redirect(url_for('index'))
+        graphs = build_statistics_graphs(df)
+        figure_cache.put(cache_key, graphs)
 
-    # Convert 'Timestamp' to datetime
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    # Render the template with the graphs
+    return render_template('statistics.html', graphs=graphs, advanced_logging=ADVANCED_LOGGING)
 
-    # Generate graphs
-    graphs = []
 
+def build_statistics_graphs(df):
+    import plotly
+    import plotly.express as px
 
+    graphs = []
 
-    charged_data = df[df['Charged mAh'].notnull()]
+    charged_data = downsample(df, 'Timestamp', 'Charged mAh', FIGURE_POINT_BUDGET, group='Battery Code')
     fig_charged = px.line(charged_data, x='Timestamp', y='Charged mAh', color='Battery Code',
                           title='Charged mAh Over Time')
     graphJSON_charged = json.dumps(fig_charged, cls=plotly.utils.PlotlyJSONEncoder)
     graphs.append(graphJSON_charged)
 
-    charge_used = df[df['Current Usage (J)'].notnull()]
+    charge_used = downsample(df, 'Timestamp', 'Current Usage (J)', FIGURE_POINT_BUDGET, group='Battery Code')
     fig_charged_used = px.line(charge_used, x='Timestamp', y='Current Usage (J)', color='Battery Code',
                                title='Current Usage (J) Over Time')
     graphJSON_charged_used = json.dumps(fig_charged_used, cls=plotly.utils.PlotlyJSONEncoder)
     graphs.append(graphJSON_charged_used)
 
-    # Render the template with the graphs
-    return render_template('statistics.html', graphs=graphs, advanced_logging=ADVANCED_LOGGING)
-
+    return graphs
 
 
 @app.route('/battery_statistics/<battery_code>')
 def battery_statistics(battery_code):
-    # Load the battery log data
-    df = pd.read_csv('battery_log.csv')
-    df['Battery Code'] = df['Battery Code'].astype(str)
+    cache_key = ('battery_statistics', battery_code, storage.log_version())
+    graphs = figure_cache.get(cache_key)
+    if graphs is None:
+        # Load only this battery's rows (per-battery index or indexed query)
+        battery_df = storage.battery_events_frame(battery_code)
+
+        if battery_df.empty:
+            flash(f"No data available for battery {battery_code}.", "warning")
+            return redirect(url_for('index'))
 
-    # Filter data for the specific battery
-    battery_df = df[df['Battery Code'] == battery_code]
+        graphs = build_battery_graphs(battery_df)
+        figure_cache.put(cache_key, graphs)
+
+    # Render the template with the graphs
+    return render_template('battery_statistics.html', battery_code=battery_code, graphs=graphs,
+                           format_battery_code=format_battery_code)
 
-    print("Unique Battery Codes in DataFrame:")
-    print(df['Battery Code'].unique())
-    if battery_df.empty:
-        flash(f"No data available for battery {battery_code}.", "warning")
-        return redirect(url_for('index'))
 
-    # Convert 'Timestamp' to datetime if not already
-    battery_df['Timestamp'] = pd.to_datetime(battery_df['Timestamp'])
+def build_battery_graphs(battery_df):
+    import plotly
+    import plotly.express as px
 
-    # Generate graphs
     graphs = []
 
     # Example Graph 1: Battery Usage Over Time
     usage_over_time = battery_df[battery_df['Status'] == 'In Use']
-    usage_over_time['Timestamp'] = pd.to_datetime(usage_over_time['Timestamp'], errors='coerce')
-    usage_over_time['Current Usage (J)'] = pd.to_numeric(usage_over_time['Current Usage (J)'], errors='coerce')
-    usage_over_time = usage_over_time.dropna(subset=['Timestamp', 'Current Usage (J)'])
+    usage_over_time = downsample(usage_over_time, 'Timestamp', 'Current Usage (J)', FIGURE_POINT_BUDGET)
     fig_charged = px.line(
         usage_over_time,
         x='Timestamp',
@@ -376,10 +622,7 @@ def battery_statistics(battery_code):
 
     # Example Graph 2: Charged mAh Over Time
     charged_over_time = battery_df[battery_df['Status'] == 'Charging']
-    print(f"Number of data points: {len(charged_over_time)}")
-    charged_over_time['Timestamp'] = pd.to_datetime(charged_over_time['Timestamp'], errors='coerce')
-    charged_over_time['Charged mAh'] = pd.to_numeric(charged_over_time['Charged mAh'], errors='coerce')
-    charged_over_time = charged_over_time.dropna(subset=['Timestamp', 'Charged mAh'])
+    charged_over_time = downsample(charged_over_time, 'Timestamp', 'Charged mAh', FIGURE_POINT_BUDGET)
 
     fig_charged = px.line(
         charged_over_time,
@@ -394,7 +637,7 @@ def battery_statistics(battery_code):
     graphs.append(graphJSON_charged)
 
     # Example Graph 3: Battery Feel Ratings Over Time
-    battery_feel_data = battery_df[battery_df['Battery Feel'].notnull()]
+    battery_feel_data = downsample(battery_df, 'Timestamp', 'Battery Feel', FIGURE_POINT_BUDGET)
     fig_feel = px.line(
         battery_feel_data,
         x='Timestamp',
@@ -407,21 +650,77 @@ def battery_statistics(battery_code):
     graphJSON_feel = json.dumps(fig_feel, cls=plotly.utils.PlotlyJSONEncoder)
     graphs.append(graphJSON_feel)
 
-    # Render the template with the graphs
-    return render_template('battery_statistics.html', battery_code=battery_code, graphs=graphs,
-                           format_battery_code=format_battery_code)
+    return graphs
 
 
 def load_settings():
     global COOLDOWN_DURATION_TIME
     global TEAM_NUMBER
     global ADVANCED_LOGGING
+    global DECODE_MOTION_THRESHOLD
+    global DECODE_DOWNSCALE
+    global DECODE_MODE
+    global DECODE_WORKERS
+    global DECODE_QUEUE_DEPTH
+    global LOG_FLUSH_INTERVAL
+    global LOG_FSYNC_POLICY
+    global LOG_FSYNC_INTERVAL
+    global STORAGE_BACKEND
+    global FIGURE_POINT_BUDGET
+    global STATE_CHECKPOINT_INTERVAL
+    global USAGE_OUTLIER_RULE
+    global USAGE_OUTLIER_THRESHOLD
+    global SCAN_QUEUE_SIZE
+    global BEEP_COALESCE_INTERVAL
+    global FRAME_SOURCE
+    global FRAME_SOURCE_PATH
+    global FRAME_SOURCE_PACED
+    global FRAME_SOURCE_LOOP
+    global SYNTHETIC_BATTERY_COUNT
+    global VIDEO_FEED_FPS
+    global VIDEO_FEED_QUALITY
+    global STATIONS
+    global ADMIN_TOKEN
+    global SERVER_THREADS
+    global SERVER_MAX_STREAMS
+    global SERVER_REQUEST_TIMEOUT
+    global SERVER_KEEPALIVE_TIMEOUT
+    global SERVER_DRAIN_TIMEOUT
     try:
         with open(SETTINGS_FILE, 'r') as f:
             settings = json.load(f)
             COOLDOWN_DURATION_TIME = settings.get('cooldown_duration_time', COOLDOWN_DURATION_TIME)
             TEAM_NUMBER = settings.get('team_number', TEAM_NUMBER)
             ADVANCED_LOGGING = settings.get('advanced_logging', ADVANCED_LOGGING)
+            DECODE_MOTION_THRESHOLD = settings.get('decode_motion_threshold', DECODE_MOTION_THRESHOLD)
+            DECODE_DOWNSCALE = settings.get('decode_downscale', DECODE_DOWNSCALE)
+            DECODE_MODE = settings.get('decode_mode', DECODE_MODE)
+            DECODE_WORKERS = settings.get('decode_workers', DECODE_WORKERS)
+            DECODE_QUEUE_DEPTH = settings.get('decode_queue_depth', DECODE_QUEUE_DEPTH)
+            LOG_FLUSH_INTERVAL = settings.get('log_flush_interval', LOG_FLUSH_INTERVAL)
+            LOG_FSYNC_POLICY = settings.get('log_fsync_policy', LOG_FSYNC_POLICY)
+            LOG_FSYNC_INTERVAL = settings.get('log_fsync_interval', LOG_FSYNC_INTERVAL)
+            STORAGE_BACKEND = settings.get('storage_backend', STORAGE_BACKEND)
+            FIGURE_POINT_BUDGET = settings.get('figure_point_budget', FIGURE_POINT_BUDGET)
+            STATE_CHECKPOINT_INTERVAL = settings.get('state_checkpoint_interval', STATE_CHECKPOINT_INTERVAL)
+            USAGE_OUTLIER_RULE = settings.get('usage_outlier_rule', USAGE_OUTLIER_RULE)
+            USAGE_OUTLIER_THRESHOLD = settings.get('usage_outlier_threshold', USAGE_OUTLIER_THRESHOLD)
+            SCAN_QUEUE_SIZE = settings.get('scan_queue_size', SCAN_QUEUE_SIZE)
+            BEEP_COALESCE_INTERVAL = settings.get('beep_coalesce_interval', BEEP_COALESCE_INTERVAL)
+            FRAME_SOURCE = settings.get('frame_source', FRAME_SOURCE)
+            FRAME_SOURCE_PATH = settings.get('frame_source_path', FRAME_SOURCE_PATH)
+            FRAME_SOURCE_PACED = settings.get('frame_source_paced', FRAME_SOURCE_PACED)
+            FRAME_SOURCE_LOOP = settings.get('frame_source_loop', FRAME_SOURCE_LOOP)
+            SYNTHETIC_BATTERY_COUNT = settings.get('synthetic_battery_count', SYNTHETIC_BATTERY_COUNT)
+            VIDEO_FEED_FPS = settings.get('video_feed_fps', VIDEO_FEED_FPS)
+            VIDEO_FEED_QUALITY = settings.get('video_feed_quality', VIDEO_FEED_QUALITY)
+            STATIONS = settings.get('stations', STATIONS)
+            ADMIN_TOKEN = settings.get('admin_token', ADMIN_TOKEN)
+            SERVER_THREADS = settings.get('server_threads', SERVER_THREADS)
+            SERVER_MAX_STREAMS = settings.get('server_max_streams', SERVER_MAX_STREAMS)
+            SERVER_REQUEST_TIMEOUT = settings.get('server_request_timeout', SERVER_REQUEST_TIMEOUT)
+            SERVER_KEEPALIVE_TIMEOUT = settings.get('server_keepalive_timeout', SERVER_KEEPALIVE_TIMEOUT)
+            SERVER_DRAIN_TIMEOUT = settings.get('server_drain_timeout', SERVER_DRAIN_TIMEOUT)
     except FileNotFoundError:
         # Settings file does not exist, keep default settings
         pass
@@ -434,7 +733,36 @@ def save_settings():
     settings = {
         'cooldown_duration_time': COOLDOWN_DURATION_TIME,
         'team_number': TEAM_NUMBER,
-        'advanced_logging': ADVANCED_LOGGING
+        'advanced_logging': ADVANCED_LOGGING,
+        'decode_motion_threshold': DECODE_MOTION_THRESHOLD,
+        'decode_downscale': DECODE_DOWNSCALE,
+        'decode_mode': DECODE_MODE,
+        'decode_workers': DECODE_WORKERS,
+        'decode_queue_depth': DECODE_QUEUE_DEPTH,
+        'log_flush_interval': LOG_FLUSH_INTERVAL,
+        'log_fsync_policy': LOG_FSYNC_POLICY,
+        'log_fsync_interval': LOG_FSYNC_INTERVAL,
+        'storage_backend': STORAGE_BACKEND,
+        'figure_point_budget': FIGURE_POINT_BUDGET,
+        'state_checkpoint_interval': STATE_CHECKPOINT_INTERVAL,
+        'usage_outlier_rule': USAGE_OUTLIER_RULE,
+        'usage_outlier_threshold': USAGE_OUTLIER_THRESHOLD,
+        'scan_queue_size': SCAN_QUEUE_SIZE,
+        'beep_coalesce_interval': BEEP_COALESCE_INTERVAL,
+        'frame_source': FRAME_SOURCE,
+        'frame_source_path': FRAME_SOURCE_PATH,
+        'frame_source_paced': FRAME_SOURCE_PACED,
+        'frame_source_loop': FRAME_SOURCE_LOOP,
+        'synthetic_battery_count': SYNTHETIC_BATTERY_COUNT,
+        'video_feed_fps': VIDEO_FEED_FPS,
+        'video_feed_quality': VIDEO_FEED_QUALITY,
+        'stations': STATIONS,
+        'admin_token': ADMIN_TOKEN,
+        'server_threads': SERVER_THREADS,
+        'server_max_streams': SERVER_MAX_STREAMS,
+        'server_request_timeout': SERVER_REQUEST_TIMEOUT,
+        'server_keepalive_timeout': SERVER_KEEPALIVE_TIMEOUT,
+        'server_drain_timeout': SERVER_DRAIN_TIMEOUT
     }
     with open(SETTINGS_FILE, 'w') as f:
         json.dump(settings, f)
@@ -448,40 +776,69 @@ def advanced_logging_input():
     with battery_status_lock:
         if battery_code in battery_status:
             # Save the data without checking awaiting_advanced_input
+            record = battery_status[battery_code]
             if 'current_usage' in data and 'battery_feel' in data:
-                battery_status[battery_code]['current_usage'] = data['current_usage']
-                battery_status[battery_code]['battery_feel'] = data['battery_feel']
+                record.current_usage = data['current_usage']
+                record.battery_feel = data['battery_feel']
             elif 'charged_mAh' in data:
-                battery_status[battery_code]['charged_mAh'] = data['charged_mAh']
+                record.charged_mAh = data['charged_mAh']
             else:
                 return jsonify({'success': False, 'message': 'Invalid data provided.'}), 400
 
             # Remove the awaiting_advanced_input flag
-            battery_status[battery_code]['awaiting_advanced_input'] = False
+            record.awaiting_advanced_input = False
+            persist_battery(battery_code)
 
             # Optionally, log this data to CSV
-            log_to_csv(battery_code, battery_status[battery_code], battery_status[battery_code]['status'])
-            print("LOGGED AT " + str(time.time()))
+            log_to_csv(battery_code, {
+                'current_usage': record.current_usage,
+                'battery_feel': record.battery_feel,
+                'charged_mAh': record.charged_mAh
+            }, record.status.label)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'message': 'Battery not found.'}), 404
 
 
+# Serve a JSON body that only changes with `key` (a tuple of state versions).
+# The body is encoded once per key and shared by every poller; clients that
+# already have it get a 304, others get it gzipped if they accept that.
+def versioned_json_response(name, key, build):
+    encoded = api_body_cache.get(name, key, lambda: build().encode('utf-8'))
+    headers = {
+        'ETag': encoded.etag,
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding',
+        # Lets clients advance timers without refetching an unchanged body
+        'X-Server-Time': f"{time.time():.3f}"
+    }
+    if request.if_none_match.contains(encoded.etag.strip('"')):
+        api_body_cache.record_response(not_modified=True)
+        return Response(status=304, headers=headers)
+
+    body = encoded.body
+    if len(body) >= GZIP_MIN_SIZE and request.accept_encodings['gzip']:
+        body = encoded.gzipped()
+        headers['Content-Encoding'] = 'gzip'
+        api_body_cache.record_response(gzipped=True)
+    return Response(body, mimetype='application/json', headers=headers)
+
+
 @app.route('/api/status_changes')
 def status_changes():
-    with battery_status_lock:
+    snapshot = fleet_snapshot
+    advanced_logging = ADVANCED_LOGGING
+
+    def build():
         # Return batteries that have changed status and require advanced logging input
-        if ADVANCED_LOGGING:
-            changes = []
-            for code, data in battery_status.items():
-                if data.get('awaiting_advanced_input', False):
-                    changes.append({
-                        'battery_code': code,
-                        'status': data['status']
-                    })
-            return jsonify(changes)
-        else:
-            return jsonify([])
+        if not advanced_logging:
+            return '[]'
+        return json.dumps([
+            {'battery_code': code, 'status': data.status.label}
+            for code, data in snapshot.batteries.items() if data.awaiting_advanced_input
+        ])
+
+    return versioned_json_response('status_changes', (snapshot.version, int(advanced_logging)), build)
 
 
 # Flask route for manual battery code entry
@@ -508,14 +865,14 @@ def manual_entry():
             return render_template('add_battery_prompt.html', battery_code=battery_code, battery_info=battery_info)
         else:
             # Existing logic for updating battery status
-            current_status = battery_status[battery_code]['status']
+            current_status = battery_status[battery_code].status
             # Determine the next status based on current status
             new_status = get_next_status(battery_code, current_status)
-            if new_status:
+            if new_status is not None:
                 if not ADVANCED_LOGGING:
-                    log_to_csv(battery_code, battery_info, new_status)
+                    log_to_csv(battery_code, battery_info, new_status.label)
                 update_battery_status(battery_code, new_status)
-                flash(f"Battery {battery_code} status updated to {new_status}.", 'success')
+                flash(f"Battery {battery_code} status updated to {new_status.label}.", 'success')
             else:
                 flash(f"Battery {battery_code} cannot change status yet.", 'error')
             return redirect(url_for('index'))
@@ -524,17 +881,16 @@ def manual_entry():
 @app.route('/api/get_battery_info/<battery_code>')
 def get_battery_info(battery_code):
     battery_code = battery_code.strip()
-    with battery_status_lock:
-        if battery_code in battery_status:
-            data = battery_status[battery_code]
-            battery_info = {
-                'battery_code': battery_code,
-                'status': data['status'],
-                'notes': data.get('notes', '')
-            }
-            return jsonify(battery_info)
-        else:
-            return jsonify({'error': 'Battery not found'}), 404
+    data = fleet_snapshot.batteries.get(battery_code)
+    if data is not None:
+        battery_info = {
+            'battery_code': battery_code,
+            'status': data.status.label,
+            'notes': data.notes
+        }
+        return jsonify(battery_info)
+    else:
+        return jsonify({'error': 'Battery not found'}), 404
 
 
 @app.route('/edit_battery', methods=['POST'])
@@ -542,24 +898,29 @@ def edit_battery():
     with battery_status_lock:
         original_battery_code = request.form.get('original_battery_code').strip()
         new_battery_code = request.form.get('battery_code').strip()
-        new_status = request.form.get('status')
         notes = request.form.get('notes', '').strip()
+        try:
+            new_status = Status.from_label(request.form.get('status'))
+        except ValueError:
+            flash('Invalid battery status.', 'error')
+            return redirect(url_for('index'))
 
         if original_battery_code != new_battery_code:
             # Handle renaming of battery code
             if new_battery_code in battery_status:
                 flash('Battery code already exists.', 'error')
                 return redirect(url_for('index'))
-            battery_status[new_battery_code] = battery_status.pop(original_battery_code)
+            add_battery_record(new_battery_code, remove_battery_record(original_battery_code))
+            cooldown_scheduler.cancel(original_battery_code)
 
         # Update status and notes
-        battery_status[new_battery_code]['status'] = new_status
-        battery_status[new_battery_code]['notes'] = notes
-        battery_status[new_battery_code]['last_change'] = datetime.now()
-        battery_status[new_battery_code]['display_time'] = timedelta(0)
-
-        # Save changes
-        save_battery_status()
+        record = battery_status[new_battery_code]
+        record.status = new_status
+        record.notes = notes
+        record.last_change = time.time()
+        schedule_cooldown(new_battery_code)
+        persist_battery(new_battery_code)
+        event_broadcaster.publish('battery_status', {'battery_code': new_battery_code, 'status': new_status.label})
 
         flash(f'Battery {new_battery_code} has been updated.', 'success')
     return redirect(url_for('index'))
@@ -588,19 +949,13 @@ def confirm_add_battery():
             return redirect(url_for('index'))
 
         # Add the battery to the system with an initial status
-        battery_status[battery_code] = {
-            'status': 'Charging',
-            'last_change': datetime.now(),
-            'display_time': timedelta(0),
-            'usage_count': 0,  # Initialize usage count
-            'notes': '',  # If you have notes
-            'current_usage': None,  # Add this line
-            'battery_feel': None,  # Add this line
-            'charged_mAh': None  # Add this line
-        }
+        add_battery_record(battery_code, BatteryRecord(Status.CHARGING))
+
+        persist_battery(battery_code)
 
         # Optionally, log this action
         log_to_csv(battery_code, battery_info, 'Added to System')
+        event_broadcaster.publish('battery_status', {'battery_code': battery_code, 'status': 'Charging'})
 
     flash(f'Battery {battery_code} has been added to the system.', 'success')
     return redirect(url_for('index'))
@@ -608,6 +963,7 @@ def confirm_add_battery():
 
 @app.route('/api/confirm_add_battery', methods=['POST'])
 def api_confirm_add_battery():
+    global pending_version
     battery_code = request.json.get('battery_code')
 
     if not battery_code:
@@ -626,96 +982,434 @@ def api_confirm_add_battery():
             return jsonify({'success': False, 'message': 'Battery already exists in the system.'})
 
         # Add the battery to the system with an initial status
-        battery_status[battery_code] = {
-            'status': 'Charging',
-            'last_change': datetime.now(),
-            'display_time': timedelta(0),
-            'usage_count': 0,  # Initialize usage count
-            'notes': '',  # If you have notes
-            'current_usage': None,  # Add this line
-            'battery_feel': None,  # Add this line
-            'charged_mAh': None  # Add this line  # If you have notes
-        }
+        add_battery_record(battery_code, BatteryRecord(Status.CHARGING))
 
         # Remove from pending batteries
         if battery_code in pending_batteries:
             pending_batteries.remove(battery_code)
+            pending_version += 1
+
+        persist_battery(battery_code)
 
         # Optionally, log this action
         log_to_csv(battery_code, battery_info, 'Added to System')
+        event_broadcaster.publish('battery_status', {'battery_code': battery_code, 'status': 'Charging'})
 
     return jsonify({'success': True, 'message': f'Battery {battery_code} has been added to the system.'})
 
 
-# API endpoint to provide battery status as JSON
+# API endpoint to provide battery status as JSON. The body only changes with
+# the state version, so pollers get a 304 until something changes; clients
+# work the timers out from timer_epoch and X-Server-Time.
 @app.route('/api/battery_status')
 def battery_status_api():
-    with battery_status_lock:
-        battery_info = [
-            {
-                'battery_code': code,
-                'status': data['status'],
-                'display_time': str(data.get('display_time', '00:00:00')),
-                'last_change': data['last_change'].strftime("%Y-%m-%d %H:%M:%S"),
-                'notes': data.get('notes', '')  # Include 'notes' in the API response
-            } for code, data in battery_status.items()
-        ]
-    return jsonify(battery_info)
+    snapshot = fleet_snapshot
+    cooldown_duration = COOLDOWN_DURATION_TIME
+    key = (snapshot.version, cooldown_duration)
+
+    def build():
+        return '[' + ', '.join(battery_entry_json(data, cooldown_duration)
+                               for data in snapshot.batteries.values()) + ']'
+
+    if 'since' not in request.args:
+        return versioned_json_response('battery_status', key, build)
+
+    # Delta sync: only what changed after the client's version. Versions
+    # restart with the server, so they are only comparable within one epoch.
+    try:
+        since = int(request.args['since'])
+    except ValueError:
+        since = -1
+    changed = None
+    if request.args.get('epoch') == BOOT_TOKEN and since >= 0:
+        changed = snapshot.changed_since(since)
+
+    header = f'{{"version": {snapshot.version}, "epoch": "{BOOT_TOKEN}", '
+    if changed is None:
+        # Too far behind (or a new client): send everything, from the shared cache
+        encoded = api_body_cache.get('battery_status', key, lambda: build().encode('utf-8'))
+        body = header + '"full": true, "batteries": ' + encoded.body.decode('utf-8') + '}'
+    else:
+        updated = [battery_entry_json(snapshot.batteries[code], cooldown_duration)
+                   for code in sorted(changed) if code in snapshot.batteries]
+        deleted = [code for code in sorted(changed) if code not in snapshot.batteries]
+        body = (header + '"full": false, "batteries": [' + ', '.join(updated) + '], '
+                '"deleted": ' + json.dumps(deleted) + '}')
+    return Response(body, mimetype='application/json',
+                    headers={'Cache-Control': 'no-store', 'X-Server-Time': f"{time.time():.3f}"})
+
+
+# One battery's /api/battery_status entry. timer_epoch is when the timer
+# started (or, counting down, when it ends), so clients can show it using
+# X-Server-Time.
+def battery_entry_json(data, cooldown_duration):
+    counts_down = data.cooldown_target is not None
+    timer_epoch = data.last_change + cooldown_duration if counts_down else data.last_change
+    return f'{data.api_json}, "timer_epoch": {timer_epoch:.3f}, "counts_down": {json.dumps(counts_down)}}}'
+
+
+def is_admin_request():
+    if ADMIN_TOKEN:
+        supplied = request.headers.get('X-Admin-Token') or request.args.get('token', '')
+        return hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # ?profile=1 samples just this request's thread until the response is
+    # built and returns the stacks instead of the page
+    if 'profile' in request.args:
+        if not is_admin_request():
+            return Response('Profiling is restricted to admins', status=403)
+        g.profiler = SamplingProfiler(thread_ids={threading.get_ident()}).start()
+
+
+@app.after_request
+def finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.stop()
+    return Response(profiler.collapsed(), content_type='text/plain; charset=utf-8', headers={
+        'Content-Disposition': f'attachment; filename=profile-{request.endpoint}.folded',
+        'X-Profiled-Status': str(response.status_code),
+        'X-Profile-Samples': str(profiler.samples)
+    })
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        size = None if response.is_streamed else response.calculate_content_length()
+        route_metrics.observe(route, response.status_code, time.perf_counter() - started, size)
+    return response
+
+
+# /metrics families kept per scan station and per pipeline stage:
+# (type, name, help, value getter)
+STATION_METRICS = [
+    ('gauge', 'battery_capture_fps', 'Frames captured per second (last 10 s)',
+     lambda station: station.producer.capture_rate.rate()),
+    ('counter', 'battery_frames_captured_total', 'Frames captured',
+     lambda station: station.producer.capture_rate.total),
+    ('counter', 'battery_scanner_frames_total', 'Frames read by the scanner',
+     lambda station: station.frame_rate.total),
+    ('counter', 'battery_scans_total', 'Barcodes decoded and submitted',
+     lambda station: station.scans),
+    ('gauge', 'battery_frames_per_scan', 'Frames read by the scanner per decoded barcode',
+     lambda station: station.frame_rate.total / station.scans if station.scans else 0.0),
+    ('histogram', 'battery_decode_latency_seconds', 'pyzbar decode time per decoded frame',
+     lambda station: station.decode_latency),
+]
+PIPELINE_METRICS = [
+    ('gauge', 'battery_pipeline_queue_depth', 'Events waiting in a scan pipeline stage',
+     lambda stage: stage.stats()['queue_depth']),
+    ('counter', 'battery_pipeline_dropped_total', 'Events dropped because a stage queue was full',
+     lambda stage: stage.dropped),
+    ('histogram', 'battery_pipeline_handler_seconds', 'Time a stage spent handling events',
+     lambda stage: stage.handler_latency),
+]
+
+
+# Prometheus text-format metrics. Everything here is read from counters and
+# histograms the hot paths already keep, so scraping costs a few
+# microseconds of locking and nothing is measured only for this endpoint.
+@app.route('/metrics')
+def metrics():
+    out = PrometheusText()
+    for kind, name, help_text, value in STATION_METRICS:
+        for station in stations:
+            getattr(out, kind)(name, help_text, value(station), {'station': station.name})
+    for origin, count in scan_duplicates.items():
+        out.counter('battery_duplicate_scans_total', 'Scans dropped by the shared dedupe', count, {'origin': origin})
+    if scan_pipeline is not None:
+        stages = [scan_pipeline.transitions] + scan_pipeline.sinks
+        for kind, name, help_text, value in PIPELINE_METRICS:
+            for stage in stages:
+                getattr(out, kind)(name, help_text, value(stage), {'stage': stage.name})
+
+    out.histogram('battery_status_lock_wait_seconds', 'Time spent waiting for battery_status_lock',
+                  battery_status_lock.wait_time)
+    out.histogram('battery_status_lock_hold_seconds', 'Time battery_status_lock was held',
+                  battery_status_lock.hold_time)
+
+    routes, requests = route_metrics.items()
+    for route, latency, _ in routes:
+        out.histogram('battery_http_request_duration_seconds', 'Time to build the response (first byte for streams)',
+                      latency, {'route': route})
+    for route, _, size in routes:
+        out.histogram('battery_http_response_size_bytes', 'Response body size (streams excluded)',
+                      size, {'route': route})
+    for (route, status), count in sorted(requests.items()):
+        out.counter('battery_http_requests_total', 'Requests served', count, {'route': route, 'status': status})
+
+    if storage is not None:
+        out.histogram('battery_log_append_seconds', 'Time to commit a batch of event log rows',
+                      storage.commit_latency)
+        out.gauge('battery_state_write_failing', '1 while battery state writes are failing',
+                  int(storage.write_error() is not None))
+    out.histogram('battery_cooldown_sweep_seconds', 'Time spent expiring one cooldown',
+                  cooldown_scheduler.callback_latency)
+    out.gauge('battery_sse_clients', 'Connected /api/events clients', event_broadcaster.client_count())
+    out.gauge('battery_mjpeg_clients', 'Connected /video_feed clients',
+              sum(station.jpeg_encoder.clients for station in stations))
+    out.gauge('battery_snapshot_version', 'Version of the published fleet snapshot', fleet_snapshot.version)
+    if http_server is not None:
+        server_stats = http_server.stats()
+        out.gauge('battery_http_in_flight', 'Requests and streams being served', server_stats['in_flight'])
+        out.gauge('battery_http_streams', 'Open streaming responses', server_stats['streams'])
+        out.gauge('battery_http_idle_connections', 'Kept-alive connections waiting for a request',
+                  server_stats['idle_connections'])
+        out.counter('battery_http_keepalive_reuses_total', 'Requests served on a kept-alive connection',
+                    server_stats['keepalive_reuses'])
+        out.counter('battery_http_streams_rejected_total', 'Streams refused with 503 at the cap',
+                    server_stats['streams_rejected'])
+    return Response(out.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Time-boxed sampling profile of every thread (scanner stations, pipeline,
+# cooldown scheduler, request handlers), returned as a collapsed-stack file
+# for flamegraph.pl or speedscope. ?seconds= (default 10, at most 60) and
+# ?interval= in milliseconds (default 5).
+@app.route('/admin/profile')
+def admin_profile():
+    if not is_admin_request():
+        return Response('Profiling is restricted to admins', status=403)
+    try:
+        seconds = min(max(float(request.args.get('seconds', DEFAULT_PROFILE_SECONDS)), 0.1), MAX_PROFILE_SECONDS)
+        interval = min(max(float(request.args.get('interval', 5)), 1), 100) / 1000
+    except ValueError:
+        return Response('seconds and interval must be numbers', status=400)
+
+    if not profile_lock.acquire(blocking=False):
+        return Response('A profile is already running', status=409)
+    try:
+        profiler = SamplingProfiler(interval).run(seconds)
+    finally:
+        profile_lock.release()
+    return Response(profiler.collapsed(), content_type='text/plain; charset=utf-8', headers={
+        'Content-Disposition': f'attachment; filename=profile-{int(profiler.started_at)}.folded',
+        'X-Profile-Samples': str(profiler.samples)
+    })
+
+
+# Per-phase startup timings (foreground and background) and when the server
+# started listening
+@app.route('/api/startup_stats')
+def startup_stats():
+    return jsonify(startup_timer.stats())
+
+
+# Viewers of /video_feed and how much JPEG encoding they share, per station
+@app.route('/api/video_stats')
+def video_stats():
+    per_station = {}
+    for station in stations:
+        per_station[station.name] = station.jpeg_encoder.stats()
+        per_station[station.name]['frame_subscribers'] = station.producer.subscriber_count()
+    return jsonify({'clients': sum(stats['clients'] for stats in per_station.values()), 'stations': per_station})
+
+
+# Frames skipped by the pre-decode gate versus frames actually decoded (all
+# stations together), each station's fps and decode latency, and how many
+# scans the shared dedupe dropped
+@app.route('/api/scanner_stats')
+def scanner_stats():
+    per_station = stations.stats()
+    skipped = sum(stats['frames_skipped'] for stats in per_station.values())
+    decoded = sum(stats['frames_decoded'] for stats in per_station.values())
+    return jsonify({
+        'frames_skipped': skipped,
+        'frames_decoded': decoded,
+        'skip_ratio': skipped / (skipped + decoded) if skipped + decoded else 0.0,
+        'duplicate_scans': dict(scan_duplicates),
+        'stations': per_station
+    })
+
+
+# Queue depth, drops and latency of each scan pipeline stage, and how many
+# beeps were coalesced
+@app.route('/api/pipeline_stats')
+def pipeline_stats():
+    if scan_pipeline is None:
+        return jsonify({})
+    stats = scan_pipeline.stats()
+    stats['audio'].update({'beeps_played': beeper.played, 'beeps_coalesced': beeper.coalesced})
+    return jsonify(stats)
+
+
+# Wait and hold time histograms for battery_status_lock, and the current
+# snapshot version
+@app.route('/api/lock_stats')
+def lock_stats():
+    return jsonify({
+        'battery_status_lock': battery_status_lock.stats(),
+        'snapshot_version': fleet_snapshot.version
+    })
+
+
+# Hit/miss and rebuild-time counters of the statistics log cache
+@app.route('/api/log_cache_stats')
+def log_cache_stats():
+    stats = storage.stats()
+    stats['figure_cache'] = figure_cache.stats()
+    stats['api_body_cache'] = api_body_cache.stats()
+    return jsonify(stats)
 
 
 @app.route('/api/pending_batteries')
 def get_pending_batteries():
     with battery_status_lock:
-        return jsonify(pending_batteries)
+        version = pending_version
+        pending = list(pending_batteries)
+    return versioned_json_response('pending_batteries', (version,), lambda: json.dumps(pending))
 
 
 @app.route('/api/remove_pending_battery', methods=['POST'])
 def remove_pending_battery():
+    global pending_version
     battery_code = request.json.get('battery_code')
     if battery_code:
         with battery_status_lock:
             if battery_code in pending_batteries:
                 pending_batteries.remove(battery_code)
+                pending_version += 1
     return jsonify({'success': True})
 
 
+# Server-Sent Events stream that pushes status transitions, new pending
+# batteries and advanced logging prompts as they happen
+@app.route('/api/events')
+def events():
+    client = event_broadcaster.subscribe()
+
+    def stream():
+        try:
+            # Ask the browser to reconnect quickly if the stream drops
+            yield 'retry: 3000\n\n'
+            while not stop_flag.is_set():
+                try:
+                    message = client.get(timeout=SSE_KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield message
+        finally:
+            event_broadcaster.unsubscribe(client)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Turn a date or datetime-local form value into a log timestamp. A bare date
+# used as the end of a range covers that whole day.
+def parse_log_time(value, end_of_range=False):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end_of_range and len(value) == 10:
+        parsed += timedelta(days=1, seconds=-1)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Filters and page size shared by /logs and /api/logs. Raises ValueError on
+# malformed input.
+def read_log_query(args):
+    limit = min(max(int(args.get('limit', LOG_PAGE_SIZE)), 1), LOG_PAGE_MAX)
+    filters = {
+        'code': args.get('code', '').strip() or None,
+        'status': args.get('status', '').strip() or None,
+        'start': parse_log_time(args.get('start', '').strip()),
+        'end': parse_log_time(args.get('end', '').strip(), end_of_range=True)
+    }
+    return limit, filters
+
+
 @app.route('/logs')
 def logs():
-    logs = []
-    # Read the CSV file
     try:
-        with open('battery_log.csv', mode='r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                logs.append(row)
-    except FileNotFoundError:
-        flash("Log file not found.", "error")
+        limit, filters = read_log_query(request.args)
+        events, next_cursor = storage.events_page(request.args.get('cursor'), limit, **filters)
+    except ValueError as e:
+        flash(f"Invalid log query: {e}", "warning")
+        limit, filters = LOG_PAGE_SIZE, {}
+        events, next_cursor = storage.events_page(None, limit)
+
+    # Page links keep the current filters
+    filter_args = {key: value for key, value in request.args.items() if key != 'cursor' and value}
+    next_args = dict(filter_args, cursor=next_cursor) if next_cursor else None
 
-    # Pass logs data to the template
-    return render_template('logs.html', logs=logs)
+    # Stream the page so rendering starts before the whole table is built
+    return Response(stream_template('logs.html', logs=events, filters=request.args, statuses=STATUS_LABELS,
+                                    filter_args=filter_args, next_args=next_args,
+                                    first_page=not request.args.get('cursor')))
 
 
+@app.route('/api/logs')
+def api_logs():
+    try:
+        limit, filters = read_log_query(request.args)
+        events, next_cursor = storage.events_page(request.args.get('cursor'), limit, **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'events': events, 'next_cursor': next_cursor})
+
+
+# MJPEG stream of a station's camera (?station=, default the first one).
+# ?fps=, ?quality= (10-95) and ?width= (pixels, downscale only) are per
+# client; the JPEG for each frame and setting is encoded once and shared by
+# every viewer of that station.
 @app.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(),
+    station = stations.get(request.args.get('station'))
+    if station is None:
+        return Response('Unknown station', status=404)
+    fps, quality, width = stream_params(request.args, station.producer.width, default_fps=VIDEO_FEED_FPS,
+                                        default_quality=VIDEO_FEED_QUALITY, max_fps=VIDEO_FEED_MAX_FPS)
+    return Response(generate_frames(station, fps, quality, width),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
-def generate_frames():
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-        else:
-            # Encode the frame as JPEG
-            ret, buffer = cv2.imencode('.jpg', frame)
-            frame = buffer.tobytes()
-
-            # Yield the frame as part of the response
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-
-    cap.release()
+def generate_frames(station, fps, quality, width):
+    jpeg_encoder = station.jpeg_encoder
+    interval = 1.0 / fps
+    last_content = None
+    # Each viewer only ever gets the newest frame, so a slow browser skips
+    # frames instead of holding back the camera or the scanner
+    with station.producer.subscribe('video_feed') as frames:
+        jpeg_encoder.client_connected()
+        try:
+            while not stop_flag.is_set():
+                captured = frames.read(timeout=1)
+                if captured is None:
+                    if frames.closed:
+                        break
+                    continue
+
+                content_id, frame = jpeg_encoder.encode(captured, quality, width)
+                if content_id == last_content or not frame:
+                    continue  # Nothing new to show
+                last_content = content_id
+
+                # The yield only returns once the server has written the part,
+                # so a slow client holds this loop and the frames published in
+                # the meantime are skipped rather than buffered for it. This
+                # needs a server whose writes block, like the werkzeug server
+                # in serving.py. Servers that copy the body into their own
+                # send buffer (waitress, for one) would let it grow instead.
+                sent_at = time.monotonic()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n'
+                       b'Content-Length: ' + str(len(frame)).encode() + b'\r\n\r\n' + frame + b'\r\n')
+                remaining = interval - (time.monotonic() - sent_at)
+                if remaining > 0:
+                    time.sleep(remaining)
+        finally:
+            jpeg_encoder.client_disconnected()
 
 
 @app.route('/settings', methods=['GET', 'POST'])
@@ -752,6 +1446,9 @@ def settings():
                         flash("Settings have NOT been updated.", "warning")
                         save_settings()  # Save settings to JSON file
 
+        # The cooldown duration may have changed
+        reschedule_cooldowns()
+
     return render_template('settings.html',
                            advanced_logging=ADVANCED_LOGGING,
                            cooldown_time=COOLDOWN_DURATION_TIME,
@@ -770,40 +1467,28 @@ def add_battery():
     battery_number = f"{number:03d}"  # Format number as "001"
     battery_code = f"{current_year}{battery_number}"
 
-    # Increment battery number if code already exists
-    while battery_code in battery_status:
-        number += 1
-        battery_number = f"{number:03d}"  # Format number with leading zeros
-        battery_code = f"{current_year}{battery_number}"
-
-    # Add the new battery to `battery_status`
-    battery_status[battery_code] = {
-        'status': 'Charging',
-        'last_change': datetime.now(),
-        'display_time': timedelta(0),
-        'usage_count': 0,  # Initialize usage count
-        'notes': '',  # If you have notes
-        'current_usage': None,  # Add this line
-        'battery_feel': None,  # Add this line
-        'charged_mAh': None  # Add this line  # If you have notes
-    }
+    with battery_status_lock:
+        # Increment battery number if code already exists
+        while battery_code in battery_status:
+            number += 1
+            battery_number = f"{number:03d}"  # Format number with leading zeros
+            battery_code = f"{current_year}{battery_number}"
+
+        # Add the new battery to `battery_status`
+        add_battery_record(battery_code, BatteryRecord(Status.CHARGING))
+        persist_battery(battery_code)
+        event_broadcaster.publish('battery_status', {'battery_code': battery_code, 'status': 'Charging'})
 
     # Return a JSON response
     return jsonify({'message': f"Battery {battery_code} added successfully."})
 
 
+# The main thread does the actual shutdown once this request has been answered
 @app.route('/stop', methods=['POST'])
 def stop_system():
-    stop_flag.set()  # Set the stop flag to terminate background threads
-    flash("System stopped successfully. Shutting down...", "success")
-
-    # Give a moment for flash message to register
-    time.sleep(1)
-
-    # Exit the program
-    save_battery_status()
-    os.abort()  # Forcefully terminate the Flask server and Python process
-    # Alternatively, use sys.exit() but note that os._exit(0) ensures immediate termination
+    request_shutdown('stop requested from the dashboard')
+    return Response("Battery Logger is shutting down. The state and log are saved before it exits.\n",
+                    mimetype='text/plain')
 
 
 @app.route('/delete_battery', methods=['POST'])
@@ -816,9 +1501,9 @@ def delete_battery():
 
     with battery_status_lock:
         if battery_code in battery_status:
-            del battery_status[battery_code]
-            # Optionally, save the updated battery status
-            save_battery_status()
+            remove_battery_record(battery_code)
+            cooldown_scheduler.cancel(battery_code)
+            event_broadcaster.publish('battery_status', {'battery_code': battery_code, 'status': None})
             flash(f'Battery {battery_code} has been deleted.', 'success')
         else:
             flash(f'Battery {battery_code} not found.', 'error')
@@ -826,63 +1511,150 @@ def delete_battery():
     return redirect(url_for('index'))
 
 
+# Write a full checkpoint of the battery state. Changes in between are kept
+# by the storage journal, so this only bounds recovery time.
 def save_battery_status():
-    with open(PERSISTENT_FILE, 'w') as f:
-        data_to_save = {
-            code: {
-                'status': data['status'],
-                'last_change': data['last_change'].strftime("%Y-%m-%d %H:%M:%S"),
-                'usage_count': data.get('usage_count', 0),
-                'notes': data.get('notes', ''),
-                'current_usage': data.get('current_usage'),
-                'battery_feel': data.get('battery_feel'),
-                'charged_mAh': data.get('charged_mAh'),
-                'awaiting_advanced_input': data.get('awaiting_advanced_input', False)
-            }
-            for code, data in battery_status.items()
-        }
-        json.dump(data_to_save, f)
+    with battery_status_lock:
+        storage.save_batteries(battery_status)
+    error = storage.write_error()
+    if error:
+        print(f"Battery state is not being saved: {error}")
 
 
-def load_initial_battery_status():
-    if os.path.exists(PERSISTENT_FILE):
-        with open(PERSISTENT_FILE, 'r') as f:
-            data_loaded = json.load(f)
-            for code, data in data_loaded.items():
-                battery_status[code] = {
-                    'status': data['status'],
-                    'last_change': datetime.strptime(data['last_change'], "%Y-%m-%d %H:%M:%S"),
-                    'display_time': timedelta(0),
-                    'usage_count': data.get('usage_count', 0),
-                    'notes': data.get('notes', ''),
-                    'current_usage': data.get('current_usage'),
-                    'battery_feel': data.get('battery_feel'),
-                    'charged_mAh': data.get('charged_mAh'),
-                    'awaiting_advanced_input': data.get('awaiting_advanced_input', False)
-                }
+def checkpoint_battery_status():
+    while not stop_flag.wait(STATE_CHECKPOINT_INTERVAL):
+        if storage.checkpoint_due():
+            save_battery_status()
 
 
-# Start the Flask app and background tasks
-if __name__ == "__main__":
+def load_initial_battery_status():
+    with battery_status_lock:
+        for code, data in storage.load_batteries().items():
+            add_battery_record(code, data)
+            # Cooldowns that ran out while the app was down fire right away
+            schedule_cooldown(code)
+        publish_snapshot(list(battery_status))
+
+
+# App factory: everything the dashboard needs to answer its first request,
+# timed phase by phase. Hardware and the analytics stack are left to
+# start_background_services(), which runs once the server is listening.
+def create_app():
+    startup_timer.mark('imports_done')
     # Load settings from file
-    load_settings()
-    # Load initial battery status from persistent file
-    load_initial_battery_status()
-
-    # Initialize CSV if necessary
-    initialize_csv()
-
-    # Start the barcode scanning in a background thread
-    scanning_thread = threading.Thread(target=scan_barcode, daemon=True)
-    scanning_thread.start()
+    with startup_timer.phase('settings'):
+        load_settings()
+    # Open the storage backend (creates the CSV log or the database if necessary)
+    with startup_timer.phase('storage'):
+        open_storage()
+    # Load initial battery status from persistent storage
+    with startup_timer.phase('battery_state'):
+        load_initial_battery_status()
+    configure_stations()
 
     # Start the auto-update cooldown statuses in a background thread
-    cooldown_thread = threading.Thread(target=auto_update_cooldown_statuses, daemon=True)
+    global cooldown_thread
+    cooldown_thread = threading.Thread(target=auto_update_cooldown_statuses, name='cooldown', daemon=True)
     cooldown_thread.start()
 
+    # Periodically compact the state journal into the checkpoint file
+    global checkpoint_thread
+    checkpoint_thread = threading.Thread(target=checkpoint_battery_status, name='checkpoint', daemon=True)
+    checkpoint_thread.start()
+    register_shutdown_hooks()
+    return app
+
+
+def stop_cooldown_thread():
+    cooldown_scheduler.stop()
+    join_thread(cooldown_thread, THREAD_STOP_TIMEOUT)
+
+
+def stop_scan_pipeline():
+    # Let queued scans finish before the final checkpoint
+    if scan_pipeline is not None:
+        scan_pipeline.stop()
+
+
+# Undo create_app() and start_background_services() in reverse: cameras
+# first so no new scans arrive, then the pipeline that applies them, the
+# cooldown and checkpoint threads that also write state, and only then the
+# final checkpoint and the log flush
+def register_shutdown_hooks():
+    shutdown_hooks.add('stations', stations.stop)
+    shutdown_hooks.add('scan_pipeline', stop_scan_pipeline)
+    shutdown_hooks.add('cooldown_thread', stop_cooldown_thread)
+    # stop_flag is already set, so the checkpoint loop is on its way out
+    shutdown_hooks.add('checkpoint_thread', lambda: join_thread(checkpoint_thread, THREAD_STOP_TIMEOUT))
+    shutdown_hooks.add('battery_state', save_battery_status)
+    shutdown_hooks.add('settings', save_settings)
+    shutdown_hooks.add('storage', lambda: storage.close())
+
+
+def request_shutdown(reason):
+    if not shutdown_requested.is_set():
+        print(f"Shutting down: {reason}")
+    shutdown_requested.set()
+
+
+def handle_signal(signum, frame):
+    request_shutdown(signal.Signals(signum).name)
+
+
+# Stop taking requests, let the ones in flight finish, then run the shutdown
+# hooks. Streaming responses (/api/events, /video_feed) check stop_flag, so
+# they end on their own once it is set.
+def shutdown(server):
+    stop_flag.set()
+    event_broadcaster.close()
+    server.stop_accepting()
+    remaining = server.drain(SERVER_DRAIN_TIMEOUT)
+    if remaining:
+        print(f"{remaining} requests still running after {SERVER_DRAIN_TIMEOUT} s, shutting down anyway")
+    if shutdown_hooks.run():
+        print(shutdown_hooks.report())
+
+
+# Bring up audio and the scan stations, then warm the analytics stack
+# so the first statistics page does not pay for the imports. A phase that
+# fails (no sound card, no camera) is reported and the rest still start.
+def start_background_services():
+    # Start the scan pipeline before the scanner feeds it
+    run_startup_phase('audio_and_pipeline', start_scan_pipeline)
+    # Start each station's capture thread and its barcode scanning thread
+    run_startup_phase('stations', stations.start)
+    run_startup_phase('analytics', warm_analytics)
+    print(startup_timer.report())
+
+
+def run_startup_phase(name, step):
     try:
-        app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
-    finally:
-        # Save battery status to persistent file on exit
-        save_battery_status()
-        save_settings()
+        with startup_timer.phase(name):
+            step()
+    except Exception as e:
+        print(f"Startup phase {name} failed: {e}")
+
+
+def warm_analytics():
+    import plotly.express
+    storage.events_frame()
+
+
+# Start the Flask app and background tasks
+if __name__ == "__main__":
+    create_app()
+    with startup_timer.phase('http_server'):
+        http_server = PooledWSGIServer(SERVER_HOST, SERVER_PORT, app, threads=SERVER_THREADS,
+                                       request_timeout=SERVER_REQUEST_TIMEOUT, streaming_paths=STREAMING_PATHS,
+                                       max_streams=SERVER_MAX_STREAMS, keepalive_timeout=SERVER_KEEPALIVE_TIMEOUT)
+        http_server.start()
+    startup_timer.mark('listening')
+    print(f"Dashboard listening on http://{SERVER_HOST}:{SERVER_PORT} after {startup_timer.elapsed() * 1000:.0f} ms")
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    threading.Thread(target=start_background_services, name='startup', daemon=True).start()
+
+    # Wake up now and then so the signal handlers get to run
+    while not shutdown_requested.wait(1):
+        pass
+    shutdown(http_server)
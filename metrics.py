@@ -0,0 +1,194 @@
+import bisect
+import threading
+import time
+from collections import deque
+
+# Upper bounds in seconds, from 10 us to 10 s
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+# Fixed-bucket histogram of durations (or any non-negative values)
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    # Cumulative counts per upper bound, like a Prometheus histogram
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count, maximum = self._sum, self._count, self._max
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            running += bucket_count
+            cumulative.append(('+Inf' if bound == float('inf') else bound, running))
+        return {'buckets': cumulative, 'sum': total, 'count': count, 'max': maximum,
+                'mean': total / count if count else 0.0}
+
+
+# Drop-in for threading.Lock that records how long callers waited to get it
+# and how long they held it
+class InstrumentedLock:
+    def __init__(self, name):
+        self.name = name
+        self.wait_time = Histogram()
+        self.hold_time = Histogram()
+        self._lock = threading.Lock()
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = time.perf_counter()
+            self.wait_time.observe(self._acquired_at - started)
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        self.hold_time.observe(held)
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def stats(self):
+        return {'wait_seconds': self.wait_time.snapshot(), 'hold_seconds': self.hold_time.snapshot()}
+
+
+# Events per second over the last `window` seconds (or since the first event,
+# if that is more recent), counted in one-second buckets
+class RateMeter:
+    def __init__(self, window=10):
+        self.window = window
+        self.total = 0
+        self._buckets = deque()  # [second, count]
+        self._started = None
+        self._lock = threading.Lock()
+
+    def mark(self, count=1):
+        now = time.monotonic()
+        second = int(now)
+        with self._lock:
+            if self._started is None:
+                self._started = now
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += count
+            else:
+                self._buckets.append([second, count])
+            self.total += count
+            self._expire(second)
+
+    def _expire(self, second):
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+
+    def rate(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._started is None:
+                return 0.0
+            self._expire(int(now))
+            span = min(self.window, max(now - self._started, 1.0))
+            return sum(count for _, count in self._buckets) / span
+
+
+# Response size buckets in bytes, from 256 B to 4 MiB
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+# Latency and response size per Flask route (the URL rule, so path
+# parameters do not create new series), and request counts per status code
+class RouteMetrics:
+    def __init__(self):
+        self._latency = {}
+        self._size = {}
+        self._requests = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, status, seconds, size=None):
+        with self._lock:
+            latency = self._latency.get(route)
+            if latency is None:
+                latency = self._latency[route] = Histogram()
+                self._size[route] = Histogram(SIZE_BUCKETS)
+            self._requests[(route, status)] = self._requests.get((route, status), 0) + 1
+        latency.observe(seconds)
+        # Streamed responses have no length up front
+        if size is not None:
+            self._size[route].observe(size)
+
+    def items(self):
+        with self._lock:
+            return ([(route, self._latency[route], self._size[route]) for route in sorted(self._latency)],
+                    dict(self._requests))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (f'{name}="' + str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') + '"'
+               for name, value in labels.items())
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Builds a Prometheus text-format (0.0.4) exposition. HELP and TYPE are
+# written the first time a metric name is used, so samples of one metric must
+# be added together.
+class PrometheusText:
+    def __init__(self):
+        self._lines = []
+        self._declared = set()
+
+    def _declare(self, name, kind, help_text):
+        if name not in self._declared:
+            self._declared.add(name)
+            self._lines.append(f'# HELP {name} {help_text}')
+            self._lines.append(f'# TYPE {name} {kind}')
+
+    def gauge(self, name, help_text, value, labels=None):
+        self._declare(name, 'gauge', help_text)
+        self._lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    def counter(self, name, help_text, value, labels=None):
+        self._declare(name, 'counter', help_text)
+        self._lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    def histogram(self, name, help_text, histogram, labels=None):
+        self._declare(name, 'histogram', help_text)
+        snapshot = histogram.snapshot()
+        labels = labels or {}
+        for bound, count in snapshot['buckets']:
+            self._lines.append(f'{name}_bucket{_format_labels(dict(labels, le=bound))} {count}')
+        self._lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(float(snapshot["sum"]))}')
+        self._lines.append(f'{name}_count{_format_labels(labels)} {snapshot["count"]}')
+
+    def render(self):
+        return '\n'.join(self._lines) + '\n'
@@ -0,0 +1,111 @@
+import threading
+
+# Client-chosen stream settings are snapped to these steps so viewers asking
+# for nearly the same thing share one encode
+QUALITY_STEP = 5
+WIDTH_STEP = 16
+
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+# Parse ?fps=&quality=&width= for /video_feed. Missing or malformed values
+# fall back to the defaults; width can only shrink the frame.
+def stream_params(args, max_width, default_fps=15, default_quality=70, max_fps=30):
+    def number(name, default, convert=int):
+        try:
+            return convert(args.get(name, default))
+        except (TypeError, ValueError):
+            return default
+
+    fps = clamp(number('fps', default_fps, float), 0.5, max_fps)
+    quality = clamp(round(number('quality', default_quality) / QUALITY_STEP) * QUALITY_STEP, 10, 95)
+    width = clamp(number('width', max_width) // WIDTH_STEP * WIDTH_STEP, 80, max_width)
+    return fps, quality, width
+
+
+# Encodes each camera frame at most once per (quality, width) and hands the
+# same bytes to every viewer. Frames that look the same as the last distinct
+# one (mean difference of a small grayscale thumbnail under
+# similarity_threshold) keep its content id, so they are neither re-encoded
+# nor re-sent.
+class SharedJpegEncoder:
+    def __init__(self, similarity_threshold=1.5, thumbnail_size=(32, 24)):
+        self.similarity_threshold = similarity_threshold
+        self.thumbnail_size = thumbnail_size
+        self.encodes = 0
+        self.shared = 0
+        self.identical_frames = 0
+        self.clients = 0
+        self._lock = threading.Lock()
+        self._last_seq = None
+        self._content_id = 0
+        self._thumbnail = None
+        # (quality, width) -> (content id, JPEG bytes), plus a lock per key so
+        # an encode for one setting does not hold up the others
+        self._encoded = {}
+        self._key_locks = {}
+
+    def _content_of(self, frame):
+        import cv2
+
+        with self._lock:
+            if frame.seq == self._last_seq:
+                return self._content_id
+            image = frame.image
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+            thumbnail = cv2.resize(gray, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+            if self._thumbnail is not None and \
+                    cv2.absdiff(thumbnail, self._thumbnail).mean() < self.similarity_threshold:
+                self.identical_frames += 1
+            else:
+                self._content_id += 1
+                self._thumbnail = thumbnail
+            self._last_seq = frame.seq
+            return self._content_id
+
+    # (content id, JPEG bytes) for a captured frame
+    def encode(self, frame, quality, width):
+        import cv2
+
+        content_id = self._content_of(frame)
+        key = (quality, width)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            cached = self._encoded.get(key)
+            if cached is not None and cached[0] >= content_id:
+                with self._lock:
+                    self.shared += 1
+                return cached
+            image = frame.image
+            if width < image.shape[1]:
+                height = max(1, round(image.shape[0] * width / image.shape[1]))
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                return cached if cached is not None else (content_id, b'')
+            encoded = (content_id, buffer.tobytes())
+            self._encoded[key] = encoded
+            with self._lock:
+                self.encodes += 1
+        return encoded
+
+    def client_connected(self):
+        with self._lock:
+            self.clients += 1
+
+    def client_disconnected(self):
+        with self._lock:
+            self.clients -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': self.clients,
+                'encodes': self.encodes,
+                'shared_encodes': self.shared,
+                'identical_frames': self.identical_frames,
+                'settings_in_use': len(self._encoded)
+            }
@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from metrics import Histogram
+
+# A battery scanned again within this many seconds of its last accepted scan
+# is the same label still in view, not a new scan
+SCAN_DEDUPE_INTERVAL = 2  # seconds
+
+# A barcode read by a scan station (check digit included)
+ScanEvent = namedtuple('ScanEvent', ['code', 'decoded_at', 'station'], defaults=('',))
+# A scan moved a battery to a new status
+TransitionEvent = namedtuple('TransitionEvent', ['code', 'battery_info', 'old_status', 'new_status',
+                                                 'awaiting_input', 'at'])
+# A scanned battery is not in the system yet
+PendingEvent = namedtuple('PendingEvent', ['code', 'at'])
+
+
+# One step of the pipeline: a bounded queue drained by its own thread. put()
+# never blocks; when the queue is full the event is dropped and counted. With
+# batch=True the handler gets every event that is waiting as one list.
+class Stage:
+    def __init__(self, name, handler, queue_size=256, batch=False):
+        self.name = name
+        self.handler = handler
+        self.batch = batch
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.queue_latency = Histogram()
+        self.handler_latency = Histogram()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=f'pipeline-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        if self._thread is None:
+            return
+        # The sentinel goes in after everything already queued
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait((time.perf_counter(), event))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            if self.batch:
+                while True:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+            stopping = None in items
+            items = [item for item in items if item is not None]
+
+            if items:
+                started = time.perf_counter()
+                for enqueued_at, _ in items:
+                    self.queue_latency.observe(started - enqueued_at)
+                events = [event for _, event in items]
+                try:
+                    if self.batch:
+                        self.handler(events)
+                    else:
+                        for event in events:
+                            self.handler(event)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error in {self.name} stage: {e}")
+                self.processed += len(events)
+                self.handler_latency.observe(time.perf_counter() - started)
+            if stopping:
+                return
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_size': self._queue.maxsize,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queue_latency_seconds': self.queue_latency.snapshot(),
+            'handler_latency_seconds': self.handler_latency.snapshot()
+        }
+
+
+# Scanner -> transitions -> sinks. The decode loop only submits ScanEvents.
+# apply_scan runs on the transitions stage and returns the events it caused;
+# each of those is offered to every sink, and a slow sink only fills its own
+# queue.
+class ScanPipeline:
+    def __init__(self, apply_scan, sinks, queue_size=256):
+        self.apply_scan = apply_scan
+        self.transitions = Stage('transitions', self._apply, queue_size=queue_size)
+        self.sinks = [Stage(name, handler, queue_size=queue_size, batch=batch) for name, handler, batch in sinks]
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+        self.transitions.start()
+
+    # Transitions first, so whatever they emit still reaches the sinks
+    def stop(self):
+        self.transitions.stop()
+        for sink in self.sinks:
+            sink.stop()
+
+    def submit(self, code, decoded_at=None, station=''):
+        return self.transitions.put(ScanEvent(code, decoded_at or time.time(), station))
+
+    def _apply(self, event):
+        for result in self.apply_scan(event) or ():
+            for sink in self.sinks:
+                sink.put(result)
+
+    def stats(self):
+        stages = [self.transitions] + self.sinks
+        return {stage.name: stage.stats() for stage in stages}
+
+
+# Plays a preloaded sound for a batch of events, at most once per
+# min_interval, so a burst of scans gives one beep instead of a queue of them
+class CoalescedBeeper:
+    def __init__(self, sound, min_interval=0.2):
+        self.sound = sound
+        self.min_interval = min_interval
+        self.played = 0
+        self.coalesced = 0
+        self._last_played = 0.0
+
+    def __call__(self, events):
+        transitions = sum(1 for event in events if isinstance(event, TransitionEvent))
+        if not transitions:
+            return
+        now = time.monotonic()
+        if self.sound is None or now - self._last_played < self.min_interval:
+            self.coalesced += transitions
+            return
+        self.sound.play()
+        self._last_played = now
+        self.played += 1
+        self.coalesced += transitions - 1
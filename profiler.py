@@ -0,0 +1,74 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Longest profile a request may ask for, and the default
+MAX_PROFILE_SECONDS = 60
+DEFAULT_PROFILE_SECONDS = 10
+DEFAULT_INTERVAL = 0.005  # seconds between samples
+
+
+# One stack as flamegraph frames, outermost first: "function (file.py:line)"
+def collapse_stack(frame, max_depth=128):
+    frames = []
+    while frame is not None and len(frames) < max_depth:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+
+# Statistical profiler: every `interval` it grabs the current stack of each
+# thread (or only thread_ids) from sys._current_frames() and counts identical
+# stacks. Nothing is hooked into the interpreter, so the threads being
+# profiled do not slow down and nothing runs at all when no profile is active.
+# The result is in the collapsed-stack format flamegraph.pl and speedscope
+# read, with the thread name as the root frame.
+class SamplingProfiler:
+    def __init__(self, interval=DEFAULT_INTERVAL, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.samples = 0
+        self.started_at = None
+        self.elapsed = 0.0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self, skip_ident):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip_ident or (self.thread_ids is not None and ident not in self.thread_ids):
+                continue
+            self._stacks[f"{names.get(ident, ident)};{collapse_stack(frame)}"] += 1
+        self.samples += 1
+
+    # Sample on the calling thread (which is left out) for `seconds`
+    def run(self, seconds):
+        own = threading.get_ident()
+        self.started_at = time.time()
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline and not self._stop.is_set():
+            self._sample(own)
+            time.sleep(self.interval)
+        self.elapsed = time.perf_counter() - started
+        return self
+
+    # Sample on a background thread until stop()
+    def start(self):
+        self._thread = threading.Thread(target=self.run, args=(MAX_PROFILE_SECONDS,), name='profiler',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self._stacks.items()))
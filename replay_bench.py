@@ -0,0 +1,170 @@
+import argparse
+import json
+import time
+from datetime import datetime
+
+from battery import BatteryRecord, NEXT_STATUS
+from frame_sources import SOURCE_KINDS, Pacer, battery_barcode, open_source
+from metrics import Histogram
+from pipeline import SCAN_DEDUPE_INTERVAL, ScanPipeline, TransitionEvent
+
+# Offline scanner benchmark: reads a frame source through the same decode
+# gate and scan pipeline the app uses, without the camera, the web server or
+# the battery files, and reports decode throughput and scan-to-transition
+# latency. Transitions are applied to an in-memory fleet.
+#
+#   python replay_bench.py synthetic
+#   python replay_bench.py video recording.mp4 --paced
+#   python replay_bench.py images missed_scan/ --decoder opencv
+
+
+def make_decoder(name):
+    if name == 'pyzbar':
+        from pyzbar.pyzbar import decode
+
+        return lambda image: [barcode.data.decode('utf-8') for barcode in decode(image)]
+    if name == 'opencv':
+        # No libzbar needed, handy on CI boxes
+        import cv2
+
+        detector = cv2.barcode.BarcodeDetector()
+
+        def decode_opencv(image):
+            # The detector misses symbols that touch the edge of the tight
+            # regions the decode gate hands out, so give it some margin
+            image = cv2.copyMakeBorder(image, 64, 64, 64, 64, cv2.BORDER_REPLICATE)
+            found, decoded, _, _ = detector.detectAndDecodeWithType(image)
+            return [code for code in decoded if code] if found else []
+        return decode_opencv
+    raise ValueError(f"Unknown decoder {name!r}")
+
+
+def summarize(histogram):
+    snapshot = histogram.snapshot()
+    return {'count': snapshot['count'], 'mean_ms': snapshot['mean'] * 1000, 'max_ms': snapshot['max'] * 1000}
+
+
+def run(source, decode, gate, paced=False, max_frames=None):
+    fleet = {}
+    last_scanned = {}
+    duplicates = 0
+    scan_to_transition = Histogram()
+    decode_latency = Histogram()
+
+    # Same transition as the app: a repeat within SCAN_DEDUPE_INTERVAL is
+    # ignored, anything else moves the battery to its next status. Unpaced
+    # replays run faster than real time, so more repeats fall in the window.
+    def apply_scan(event):
+        nonlocal duplicates
+        code = event.code[:-1]
+        if code in last_scanned and event.decoded_at - last_scanned[code] <= SCAN_DEDUPE_INTERVAL:
+            duplicates += 1
+            return []
+        last_scanned[code] = event.decoded_at
+        record = fleet.setdefault(code, BatteryRecord())
+        old_status = record.status
+        record.status = NEXT_STATUS[old_status]
+        now = time.time()
+        scan_to_transition.observe(now - event.decoded_at)
+        return [TransitionEvent(code, {}, old_status, record.status, False, now)]
+
+    pipeline = ScanPipeline(apply_scan, [])
+    pipeline.start()
+
+    shown = set()
+    decoded = set()
+    frames = 0
+    decode_seconds = 0.0
+    pacer = Pacer(source.fps if paced else None)
+    started = time.perf_counter()
+    try:
+        while max_frames is None or frames < max_frames:
+            ret, image = source.read()
+            if not ret:
+                break
+            captured_at = time.time()
+            frames += 1
+            label = getattr(source, 'label', None)
+            if label is not None:
+                shown.add(label)
+
+            region = gate.select(image)
+            if region is not None:
+                decode_started = time.perf_counter()
+                codes = decode(region)
+                elapsed = time.perf_counter() - decode_started
+                decode_seconds += elapsed
+                decode_latency.observe(elapsed)
+                for code in codes:
+                    decoded.add(code)
+                    pipeline.submit(code, captured_at)
+            pacer.wait()
+    finally:
+        source.release()
+        pipeline.stop()
+    wall_seconds = time.perf_counter() - started
+
+    report = {
+        'frames': frames,
+        'wall_seconds': wall_seconds,
+        'frames_per_second': frames / wall_seconds if wall_seconds else 0.0,
+        'decode_frames_per_second': gate.frames_decoded / decode_seconds if decode_seconds else 0.0,
+        'gate': gate.stats(),
+        'decode_latency': summarize(decode_latency),
+        'scan_to_transition': summarize(scan_to_transition),
+        'pipeline': pipeline.stats()['transitions'],
+        'duplicate_scans': duplicates,
+        'codes_decoded': len(decoded)
+    }
+    if shown:
+        # Synthetic sources know what was on screen, so misses can be listed
+        report['codes_shown'] = len(shown)
+        report['codes_missed'] = sorted(shown - decoded)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay frames through the scanner and measure it")
+    parser.add_argument('source', choices=SOURCE_KINDS)
+    parser.add_argument('path', nargs='?', default='', help="video file or image directory")
+    parser.add_argument('--paced', action='store_true', help="replay at the source frame rate")
+    parser.add_argument('--frames', type=int, default=None, help="stop after this many frames")
+    parser.add_argument('--loop', action='store_true', help="restart the source when it ends")
+    parser.add_argument('--decoder', choices=('pyzbar', 'opencv'), default='pyzbar')
+    parser.add_argument('--team', default='1294', help="team number for synthetic barcodes")
+    parser.add_argument('--batteries', type=int, default=10, help="number of synthetic barcodes")
+    parser.add_argument('--width', type=int, default=320)
+    parser.add_argument('--height', type=int, default=240)
+    parser.add_argument('--motion-threshold', type=float, default=0.002)
+    parser.add_argument('--downscale', type=float, default=1.0)
+    parser.add_argument('--json', action='store_true', help="print the full report as JSON")
+    args = parser.parse_args()
+
+    from decode_gate import DecodeGate
+
+    codes = [battery_barcode(args.team, datetime.now().year, number) for number in range(1, args.batteries + 1)]
+    source = open_source(args.source, args.path, width=args.width, height=args.height, codes=codes, loop=args.loop)
+    gate = DecodeGate(motion_threshold=args.motion_threshold, downscale=args.downscale)
+    report = run(source, make_decoder(args.decoder), gate, paced=args.paced, max_frames=args.frames)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"Frames:              {report['frames']} in {report['wall_seconds']:.2f} s "
+          f"({report['frames_per_second']:.1f} fps, {'paced' if args.paced else 'unpaced'})")
+    print(f"Decoded frames:      {report['gate']['frames_decoded']} "
+          f"({report['gate']['skip_ratio']:.0%} skipped by the gate), "
+          f"{report['decode_frames_per_second']:.1f} decodes/s")
+    print(f"Decode latency:      mean {report['decode_latency']['mean_ms']:.2f} ms, "
+          f"max {report['decode_latency']['max_ms']:.2f} ms")
+    print(f"Scan to transition:  mean {report['scan_to_transition']['mean_ms']:.2f} ms, "
+          f"max {report['scan_to_transition']['max_ms']:.2f} ms over {report['scan_to_transition']['count']} scans")
+    print(f"Duplicate scans:     {report['duplicate_scans']} (within {SCAN_DEDUPE_INTERVAL} s, ignored)")
+    if 'codes_shown' in report:
+        print(f"Codes decoded:       {report['codes_decoded']} of {report['codes_shown']} shown")
+        if report['codes_missed']:
+            print(f"Missed:              {', '.join(report['codes_missed'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import heapq
+import itertools
+import threading
+import time
+
+from metrics import Histogram
+
+
+# Fires a callback for each key at its deadline. Deadlines live in a min-heap
+# and the worker sleeps until the earliest one, so the cost is per expiry
+# rather than per battery per second. Rescheduling or cancelling a key just
+# replaces its token; stale heap entries are discarded when they surface.
+class DeadlineScheduler:
+    def __init__(self, callback):
+        self.callback = callback
+        self._heap = []
+        self._tokens = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        # How long each callback ran (the cooldown expiry work)
+        self.callback_latency = Histogram()
+
+    # Schedule key to fire at deadline (seconds since the epoch), replacing any
+    # deadline it already had
+    def schedule(self, key, deadline):
+        with self._condition:
+            token = next(self._counter)
+            self._tokens[key] = token
+            heapq.heappush(self._heap, (deadline, token, key))
+            # Only wake the worker if this is now the earliest deadline
+            if self._heap[0][1] == token:
+                self._condition.notify()
+
+    def cancel(self, key):
+        with self._condition:
+            self._tokens.pop(key, None)
+
+    def _discard_stale(self):
+        while self._heap and self._tokens.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                self._discard_stale()
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                deadline, token, key = self._heap[0]
+                remaining = deadline - time.time()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                heapq.heappop(self._heap)
+                del self._tokens[key]
+
+            # Run the callback without holding the scheduler lock so it can
+            # schedule follow-up deadlines
+            started = time.perf_counter()
+            try:
+                self.callback(key)
+            except Exception as e:
+                print(f"Error in scheduled callback for {key}: {e}")
+            self.callback_latency.observe(time.perf_counter() - started)
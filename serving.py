@@ -0,0 +1,349 @@
+import io
+import itertools
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import StreamRequestHandler
+from urllib.parse import urlsplit
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# Production WSGI serving on werkzeug. Ordinary requests run on a fixed pool
+# of worker threads; streaming responses (/api/events, /video_feed) keep their
+# connection open for as long as the dashboard tab does, so they are handed
+# to a thread of their own instead and never take a worker away from the
+# polled APIs. The number of streams is capped, and clients over the cap get
+# a 503.
+#
+# Connections are kept alive between ordinary requests. An idle connection
+# does not hold a worker either: it waits on a selector thread, goes back to
+# the pool when its next request arrives, and is closed after
+# keepalive_timeout seconds without one.
+#
+# werkzeug writes every response straight to the socket, so a write only
+# returns once the kernel has taken the data. The MJPEG feed relies on that
+# to skip frames for slow viewers.
+
+# Request bodies up to this size are read before the application runs, which
+# keep-alive needs (see PooledRequestHandler.run_wsgi); larger uploads close
+# the connection afterwards instead
+MAX_KEEPALIVE_BODY = 1024 * 1024
+
+
+class PooledRequestHandler(WSGIRequestHandler):
+    # HTTP/1.1 for chunked streaming responses and keep-alive
+    protocol_version = 'HTTP/1.1'
+    # A client has this long to send its request, and a stream this long to
+    # accept more data, before the connection is dropped
+    timeout = 5
+    streaming = False
+    keep_alive = False
+
+    # One request per call; the server decides what happens to the connection
+    # afterwards
+    def handle(self):
+        self.keep_alive = False
+        self.close_connection = True
+        try:
+            self.handle_one_request()
+        except (ConnectionError, socket.timeout) as e:
+            self.connection_dropped(e)
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        if self.server.is_streaming(self.path):
+            # Stop here; the server runs the request on a stream thread
+            self.streaming = True
+            self.close_connection = True
+            return False
+        self.keep_alive = not self.close_connection and self._body_length() is not None
+        if not self.keep_alive:
+            self.close_connection = True
+        return True
+
+    # The request body's length if it can be read up front, else None
+    def _body_length(self):
+        if self.headers.get('Transfer-Encoding') or self.headers.get('Expect'):
+            return None
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            return None
+        return length if 0 <= length <= MAX_KEEPALIVE_BODY else None
+
+    # werkzeug reads whatever is left on the socket after a response, which
+    # would swallow the client's next request on a kept-alive connection. The
+    # application reads the body from a copy instead, so that clean-up finds
+    # nothing to discard on the socket itself.
+    def run_wsgi(self):
+        if not self.keep_alive:
+            return super().run_wsgi()
+        socket_reader = self.rfile
+        length = self._body_length()
+        body = socket_reader.read(length) if length else b''
+        if len(body) < length:
+            self.close_connection = True
+            return
+        self.rfile = io.BytesIO(body)
+        try:
+            super().run_wsgi()
+        finally:
+            self.rfile = socket_reader
+
+    # werkzeug marks every response Connection: close
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection' and self.keep_alive and not self.close_connection:
+            value = 'keep-alive'
+        super().send_header(keyword, value)
+
+    def connection_dropped(self, error, environ=None):
+        self.close_connection = True
+
+    def finish(self):
+        # A streaming or kept-alive connection outlives the pool worker
+        if self.close_connection and not self.streaming:
+            super().finish()
+
+    # Whether the client's next request is already here: in the read buffer
+    # or waiting on the socket
+    def request_waiting(self):
+        try:
+            self.connection.setblocking(False)
+            try:
+                return bool(self.rfile.peek(1))
+            finally:
+                self.connection.settimeout(self.timeout)
+        except (OSError, ValueError):
+            return False
+
+    def serve_stream(self):
+        try:
+            self.run_wsgi()
+        finally:
+            self.close()
+
+    def reject_stream(self):
+        try:
+            self.send_error(503, "Too many streaming clients")
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            StreamRequestHandler.finish(self)
+        except (OSError, ValueError):
+            pass
+
+
+# werkzeug's server, but requests run on a ThreadPoolExecutor instead of a
+# new thread each, and the server counts them so shutdown can drain
+class PooledWSGIServer(BaseWSGIServer):
+    multithread = True
+
+    def __init__(self, host, port, app, threads=16, request_timeout=5, streaming_paths=(), max_streams=64,
+                 keepalive_timeout=15, max_idle=256):
+        handler = type('RequestHandler', (PooledRequestHandler,), {'timeout': request_timeout})
+        super().__init__(host, port, app, handler=handler)
+        self.threads = threads
+        self.streaming_paths = tuple(streaming_paths)
+        self.max_streams = max_streams
+        self.keepalive_timeout = keepalive_timeout
+        self.max_idle = max_idle
+        self.streams = 0
+        self.streams_rejected = 0
+        self.keepalive_reuses = 0
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        self._stream_ids = itertools.count(1)
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self._thread = None
+        # Kept-alive connections waiting for their next request
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        self._to_park = []
+        self._parked = 0
+        self._closing = False
+        self._keepalive_thread = None
+
+    def is_streaming(self, path):
+        return urlsplit(path).path in self.streaming_paths
+
+    def process_request(self, request, client_address):
+        with self._idle:
+            self._in_flight += 1
+        self._pool.submit(self._serve, None, request, client_address)
+
+    # The handler, so _serve can tell what to do with the connection next
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    # Serve one request on a pool worker. handler is None for a new
+    # connection, or the handler of a kept-alive one whose next request is in.
+    def _serve(self, handler, request, client_address):
+        kept = None
+        try:
+            if handler is None:
+                handler = self.finish_request(request, client_address)
+            else:
+                handler.handle()
+                handler.finish()
+            kept = self._keep(handler, request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if kept is None:
+                if handler is not None:
+                    handler.close()
+                self.shutdown_request(request)
+            # A stream counts as in flight until it ends
+            if kept != 'stream':
+                self._request_done()
+
+    # Hand the connection on after a request: to a stream thread, back to the
+    # pool, or to the keep-alive selector. None means close it.
+    def _keep(self, handler, request, client_address):
+        if handler.streaming:
+            return 'stream' if self._start_stream(handler, request, client_address) else None
+        if handler.close_connection:
+            return None
+        if handler.request_waiting():
+            return 'pool' if self._resume(handler, request, client_address) else None
+        with self._idle:
+            if self._closing or self._parked >= self.max_idle:
+                return None
+            self._parked += 1
+            self._to_park.append((handler, request, client_address))
+        self._wake()
+        return 'parked'
+
+    def _resume(self, handler, request, client_address):
+        with self._idle:
+            self._in_flight += 1
+            self.keepalive_reuses += 1
+        try:
+            self._pool.submit(self._serve, handler, request, client_address)
+        except RuntimeError:
+            # The pool has shut down
+            self._request_done()
+            return False
+        return True
+
+    def _wake(self):
+        try:
+            self._wakeup_writer.send(b'\0')
+        except OSError:
+            pass
+
+    def _watch_idle(self):
+        while True:
+            for key, events in self._selector.select(timeout=1):
+                if key.fileobj is self._wakeup_reader:
+                    self._wakeup_reader.recv(4096)
+                    continue
+                self._selector.unregister(key.fileobj)
+                self._unpark()
+                handler, request, client_address, parked_at = key.data
+                if not self._resume(handler, request, client_address):
+                    self._close_idle(handler, request)
+
+            with self._idle:
+                to_park, self._to_park = self._to_park, []
+                closing = self._closing
+            now = time.monotonic()
+            for handler, request, client_address in to_park:
+                try:
+                    self._selector.register(request, selectors.EVENT_READ, (handler, request, client_address, now))
+                except (OSError, ValueError):
+                    self._unpark()
+                    self._close_idle(handler, request)
+            for key in list(self._selector.get_map().values()):
+                if key.data is None:
+                    continue
+                if closing or now - key.data[3] > self.keepalive_timeout:
+                    self._selector.unregister(key.fileobj)
+                    self._unpark()
+                    self._close_idle(key.data[0], key.data[1])
+            if closing:
+                return
+
+    def _unpark(self):
+        with self._idle:
+            self._parked -= 1
+
+    def _close_idle(self, handler, request):
+        handler.close()
+        self.shutdown_request(request)
+
+    def _start_stream(self, handler, request, client_address):
+        with self._idle:
+            accepted = self.streams < self.max_streams
+            if accepted:
+                self.streams += 1
+            else:
+                self.streams_rejected += 1
+        if not accepted:
+            print(f"Rejected stream {handler.path} from {client_address[0]}: {self.max_streams} streams open")
+            handler.reject_stream()
+            return False
+        thread = threading.Thread(target=self._serve_stream, args=(handler, request, client_address),
+                                  name=f'http-stream-{next(self._stream_ids)}', daemon=True)
+        thread.start()
+        return True
+
+    def _serve_stream(self, handler, request, client_address):
+        try:
+            handler.serve_stream()
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._idle:
+                self.streams -= 1
+            self._request_done()
+
+    def _request_done(self):
+        with self._idle:
+            self._in_flight -= 1
+            self._idle.notify_all()
+
+    def start(self):
+        self._keepalive_thread = threading.Thread(target=self._watch_idle, name='http-keepalive', daemon=True)
+        self._keepalive_thread.start()
+        self._thread = threading.Thread(target=self.serve_forever, name='http-server', daemon=True)
+        self._thread.start()
+
+    # Stop taking connections; idle kept-alive ones are closed, requests in
+    # flight carry on
+    def stop_accepting(self):
+        self.shutdown()
+        self.server_close()
+        with self._idle:
+            self._closing = True
+        self._wake()
+        if self._keepalive_thread is not None:
+            self._keepalive_thread.join(2)
+
+    # Wait until every request in flight has finished or timeout passed;
+    # returns how many are still running
+    def drain(self, timeout):
+        with self._idle:
+            self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+            remaining = self._in_flight
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        return remaining
+
+    def stats(self):
+        with self._idle:
+            return {
+                'threads': self.threads,
+                'in_flight': self._in_flight,
+                'idle_connections': self._parked,
+                'keepalive_reuses': self.keepalive_reuses,
+                'streams': self.streams,
+                'max_streams': self.max_streams,
+                'streams_rejected': self.streams_rejected
+            }
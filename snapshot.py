@@ -0,0 +1,59 @@
+import time
+from collections import namedtuple
+
+# Immutable copy of one battery's state as readers see it. api_json is the
+# record's cached /api/battery_status fragment.
+BatteryView = namedtuple('BatteryView', ['code', 'status', 'last_change', 'usage_count', 'notes',
+                                         'awaiting_advanced_input', 'cooldown_target', 'api_json'])
+
+
+def battery_view(code, record):
+    return BatteryView(code, record.status, record.last_change, record.usage_count, record.notes,
+                       record.awaiting_advanced_input, record.cooldown_target, record.api_json(code))
+
+
+# A published version of the whole fleet. Writers build a new one with
+# evolve() while holding battery_status_lock and swap the module reference;
+# readers just take the reference, so they never wait for the lock. Nothing
+# in a snapshot may be modified after it is published.
+#
+# Each snapshot also carries a bounded change log, (version, codes) for the
+# most recent versions, so clients can ask what changed since a version.
+class FleetSnapshot:
+    __slots__ = ('version', 'batteries', 'overused', 'underused', 'changes', 'published_at')
+
+    def __init__(self, version=0, batteries=None, overused=(), underused=(), changes=()):
+        self.version = version
+        self.batteries = batteries if batteries is not None else {}
+        self.overused = tuple(overused)
+        self.underused = tuple(underused)
+        self.changes = changes
+        self.published_at = time.time()
+
+    # New snapshot with `changes` ({code: BatteryView, or None if removed})
+    # applied. Views of batteries that did not change are shared. The change
+    # log keeps the last change_log_size versions.
+    def evolve(self, changes, overused, underused, change_log_size=256):
+        batteries = dict(self.batteries)
+        for code, view in changes.items():
+            if view is None:
+                batteries.pop(code, None)
+            else:
+                batteries[code] = view
+        version = self.version + 1
+        change_log = (self.changes + ((version, tuple(changes)),))[-change_log_size:]
+        return FleetSnapshot(version, batteries, overused, underused, change_log)
+
+    # Codes added, changed or removed after `version`, or None if the change
+    # log no longer reaches back that far (or the version is from the future)
+    def changed_since(self, version):
+        if version == self.version:
+            return set()
+        if version > self.version or not self.changes or version < self.changes[0][0] - 1:
+            return None
+        codes = set()
+        for change_version, change_codes in reversed(self.changes):
+            if change_version <= version:
+                break
+            codes.update(change_codes)
+        return codes
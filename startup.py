@@ -0,0 +1,56 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Records how long each startup phase took, relative to when the timer was
+# created (the top of main.py). Phases may run on background threads; marks
+# are single points in time such as "server listening".
+class StartupTimer:
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._phases = []
+        self._marks = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self._origin
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.record(name, started - self._origin, time.perf_counter() - started, error)
+
+    def record(self, name, started_at, seconds, error=None):
+        with self._lock:
+            self._phases.append({
+                'name': name,
+                'started_at': round(started_at, 4),
+                'seconds': round(seconds, 4),
+                'thread': threading.current_thread().name,
+                'error': error
+            })
+
+    def mark(self, name):
+        with self._lock:
+            self._marks[name] = round(self.elapsed(), 4)
+
+    def stats(self):
+        with self._lock:
+            return {'phases': list(self._phases), 'marks': dict(self._marks)}
+
+    # One line per phase, for the console
+    def report(self):
+        stats = self.stats()
+        lines = [f"  {phase['name']:<20} {phase['seconds'] * 1000:8.1f} ms  (at {phase['started_at'] * 1000:.0f} ms"
+                 f", {phase['thread']}){'  FAILED: ' + phase['error'] if phase['error'] else ''}"
+                 for phase in stats['phases']]
+        lines += [f"  {name:<20} at {offset * 1000:.0f} ms" for name, offset in stats['marks'].items()]
+        return "Startup timing:\n" + "\n".join(lines)
@@ -0,0 +1,164 @@
+import threading
+import time
+
+from metrics import Histogram, RateMeter
+from mjpeg import SharedJpegEncoder
+
+
+# One scan station: a frame producer (camera or other frame source) with its
+# own decode loop. Every station submits into the same scan pipeline, whose
+# transitions stage is the only place state changes and scans are
+# de-duplicated, so two cameras seeing one label cannot both move it.
+#
+# Decoding runs on the station's thread (pyzbar releases the GIL while it
+# works, so stations decode in parallel) or, in 'process' mode, in the
+# station's own DecodePool.
+class ScanStation:
+    def __init__(self, name, producer, submit, decode_mode='thread', workers=2, queue_depth=4,
+                 motion_threshold=0.002, downscale=1.0):
+        self.name = name
+        self.producer = producer
+        self.submit = submit
+        self.decode_mode = decode_mode
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.motion_threshold = motion_threshold
+        self.downscale = downscale
+        self.jpeg_encoder = SharedJpegEncoder()
+        self.gate = None
+        self.frame_rate = RateMeter()
+        self.decode_rate = RateMeter()
+        # Decode call time in thread mode; capture to result (queueing
+        # included) in process mode
+        self.decode_latency = Histogram()
+        self.scans = 0
+        self.error = None
+        self._frames = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.producer.start()
+        self._thread = threading.Thread(target=self._run, name=f'station-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        self.producer.stop(timeout)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _submit_codes(self, codes, captured_at):
+        for code in codes:
+            self.scans += 1
+            if not self.submit(code, captured_at, self.name):
+                print(f"Scan queue full, dropped {code} from station {self.name}")
+
+    def _on_pool_result(self, seq, codes, timestamp):
+        self.decode_latency.observe(time.time() - timestamp)
+        self.decode_rate.mark()
+        self._submit_codes(codes, timestamp)
+
+    def _run(self):
+        try:
+            from pyzbar.pyzbar import decode
+        except ImportError as e:
+            self.error = f"Barcode scanning disabled: {e}"
+            print(self.error)
+            return
+        from decode_gate import DecodeGate
+        from decode_pool import DecodePool
+
+        print(f"Starting barcode scanning on station {self.name}...")
+        frames = self._frames = self.producer.subscribe(f'scanner-{self.name}')
+        self.gate = DecodeGate(motion_threshold=self.motion_threshold, downscale=self.downscale)
+
+        pool = None
+        if self.decode_mode == 'process':
+            pool = DecodePool(self._on_pool_result, workers=self.workers, queue_depth=self.queue_depth)
+            pool.start()
+            print(f"Station {self.name} decoding with {self.workers} worker processes")
+
+        try:
+            while True:
+                captured = frames.read(timeout=1)
+                if captured is None:
+                    if frames.closed:
+                        break
+                    continue
+                self.frame_rate.mark()
+
+                # Skip frames where nothing moved and only decode the part that changed
+                region = self.gate.select(captured.image)
+                if region is None:
+                    continue
+
+                if pool is not None:
+                    pool.submit(region, captured.timestamp)
+                    continue
+
+                started = time.perf_counter()
+                codes = [barcode.data.decode('utf-8') for barcode in decode(region)]
+                self.decode_latency.observe(time.perf_counter() - started)
+                self.decode_rate.mark()
+                self._submit_codes(codes, captured.timestamp)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Station {self.name} stopped: {e}")
+        finally:
+            frames.close()
+            if pool is not None:
+                pool.stop()
+
+    def stats(self):
+        gate = self.gate.stats() if self.gate is not None else {
+            'frames_skipped': 0, 'frames_decoded': 0, 'skip_ratio': 0.0}
+        latency = self.decode_latency.snapshot()
+        return dict(gate, **{
+            'capture_fps': self.producer.capture_rate.rate(),
+            'scan_fps': self.frame_rate.rate(),
+            'decode_fps': self.decode_rate.rate(),
+            'decode_latency_seconds': latency,
+            'frames_dropped': self._frames.frames_dropped if self._frames is not None else 0,
+            'scans': self.scans,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'error': self.error
+        })
+
+
+# The configured stations by name, in configuration order. The first one is
+# the default for anything that does not name a station (/video_feed).
+class StationRegistry:
+    def __init__(self):
+        self._stations = {}
+        self._lock = threading.Lock()
+
+    def add(self, station):
+        with self._lock:
+            if station.name in self._stations:
+                raise ValueError(f"Duplicate station name {station.name!r}")
+            self._stations[station.name] = station
+
+    def get(self, name=None):
+        with self._lock:
+            if name:
+                return self._stations.get(name)
+            return next(iter(self._stations.values()), None)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._stations.values()))
+
+    def __len__(self):
+        return len(self._stations)
+
+    def start(self):
+        for station in self:
+            station.start()
+
+    def stop(self):
+        for station in self:
+            station.stop()
+
+    def stats(self):
+        return {station.name: station.stats() for station in self}
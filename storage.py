@@ -0,0 +1,528 @@
+import base64
+import csv
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from battery import BatteryRecord, TIMESTAMP_FORMAT, format_timestamp
+from journal import StateJournal
+from log_index import LogIndex
+from log_writer import LogWriter
+from metrics import Histogram
+
+CSV_HEADER = [
+    'Timestamp',
+    'Battery Code',
+    'Team Number',
+    'Purchase Year',
+    'Battery Number',
+    'Status',
+    'Current Usage (J)',
+    'Battery Feel',
+    'Charged mAh'
+]
+
+
+# Battery record <-> JSON-friendly dict
+def serialize_battery(record):
+    return record.to_dict()
+
+
+def deserialize_battery(data):
+    return BatteryRecord.from_dict(data)
+
+
+# Page cursors are opaque to clients: the backend name plus a position (a byte
+# offset into the CSV log, or an events rowid), base64 encoded
+def encode_cursor(backend, position):
+    return base64.urlsafe_b64encode(f"{backend}:{position}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, backend):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        name, position = base64.urlsafe_b64decode(padded.encode()).decode().split(':', 1)
+        position = int(position)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if name != backend or position < 0:
+        raise ValueError("Cursor belongs to a different storage backend")
+    return position
+
+
+# Yield (offset, line) for the complete lines in file[start:end], last line
+# first, reading block_size bytes at a time from the end
+def iter_lines_backwards(file, start, end, block_size=65536):
+    buffer = b''
+    position = end
+    first_block = True
+    while position > start:
+        read_from = max(start, position - block_size)
+        file.seek(read_from)
+        buffer = file.read(position - read_from) + buffer
+        position = read_from
+        if first_block:
+            # Skip a row that is still being written
+            buffer = buffer[:buffer.rfind(b'\n') + 1]
+            first_block = False
+
+        lines = buffer.split(b'\n')[:-1]
+        # Unless we reached the start, the first piece may be part of a line
+        # that continues in the previous block
+        keep = lines.pop(0) if position > start and lines else None
+        line_end = position + len(buffer)
+        for line in reversed(lines):
+            line_start = line_end - len(line) - 1
+            yield line_start, line
+            line_end = line_start
+        buffer = b'' if keep is None else buffer[:len(keep) + 1]
+
+
+def row_to_event(row):
+    row = (list(row) + [''] * len(CSV_HEADER))[:len(CSV_HEADER)]
+    return {column: '' if value is None else str(value) for column, value in zip(CSV_HEADER, row)}
+
+
+# analytics (and with it pandas) is only imported by the methods that return
+# DataFrames, so opening storage and loading battery state stay cheap
+
+
+# Original storage: battery state in a JSON checkpoint plus a write-ahead
+# journal of changes since it, history in an append-only CSV log written by a
+# LogWriter thread
+class JsonCsvStorage:
+    name = 'json'
+
+    def __init__(self, state_path, log_path, flush_interval=0.5, fsync_policy='interval', fsync_interval=5.0,
+                 journal_flush_interval=0.05):
+        self.state_path = state_path
+        self.log_path = log_path
+        self.journal = StateJournal(state_path + '.journal', state_path, flush_interval=journal_flush_interval,
+                                    fsync=fsync_policy != 'none')
+        self._log_cache = None
+        self._log_cache_lock = threading.Lock()
+        self.log_index = LogIndex(log_path)
+        self.log_writer = LogWriter(log_path, CSV_HEADER, flush_interval=flush_interval,
+                                    fsync_policy=fsync_policy, fsync_interval=fsync_interval,
+                                    on_commit=self.log_index.record_commit)
+
+    def open(self):
+        # Initialize the CSV file and write headers if it doesn’t exist
+        if not os.path.exists(self.log_path):
+            with open(self.log_path, mode='w', newline='') as file:
+                csv.writer(file).writerow(CSV_HEADER)
+        self.log_index.load()
+        self.log_writer.start()
+        self.journal.start()
+
+    def close(self):
+        self.journal.stop()
+        self.log_writer.stop()
+        self.log_index.close()
+
+    def flush(self):
+        self.journal.flush()
+        self.log_writer.flush()
+
+    # Last checkpoint with the journal replayed on top
+    def load_batteries(self):
+        return {code: deserialize_battery(data) for code, data in self.journal.recover().items()}
+
+    # Write a new checkpoint. Call with the battery state locked so no change
+    # can slip in between the snapshot and the journal.
+    def save_batteries(self, batteries):
+        self.journal.checkpoint({code: serialize_battery(data) for code, data in batteries.items()})
+
+    def checkpoint_due(self):
+        return self.journal.entries_since_checkpoint > 0
+
+    # Why battery state is not reaching the disk right now, or None
+    def write_error(self):
+        return self.journal.error
+
+    def save_battery(self, code, data):
+        self.journal.put(code, serialize_battery(data))
+
+    def delete_battery(self, code):
+        self.journal.delete(code)
+
+    def append_event(self, row):
+        self.log_writer.write(row)
+
+    @property
+    def log_cache(self):
+        with self._log_cache_lock:
+            if self._log_cache is None:
+                from analytics import LogCache
+                self._log_cache = LogCache(self.log_path)
+            return self._log_cache
+
+    def events_frame(self):
+        return self.log_cache.frame()
+
+    def battery_events_frame(self, code):
+        from analytics import parse_log_bytes
+        return parse_log_bytes(self.log_index.read_rows(code))
+
+    # Changes whenever a row reaches the log (or the log is replaced)
+    def log_version(self):
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    # One page of events, newest first, plus the cursor for the next page (None
+    # on the last page). Reads backwards from the cursor, so only the rows on
+    # the page and the ones filtered out along the way are touched. start and
+    # end are timestamps in TIMESTAMP_FORMAT and are inclusive.
+    def events_page(self, cursor=None, limit=50, code=None, status=None, start=None, end=None):
+        before = decode_cursor(cursor, self.name)
+        events = []
+        next_position = None
+        try:
+            file = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return events, None
+        with file:
+            header_end = len(file.readline())
+            if code:
+                # The index knows exactly where this battery's rows are
+                candidates = self._indexed_lines(file, code, before)
+            else:
+                candidates = iter_lines_backwards(file, header_end,
+                                                  os.fstat(file.fileno()).st_size if before is None else before)
+
+            for offset, line in candidates:
+                row = next(csv.reader([line.decode('utf-8')]), None)
+                if not row:
+                    continue
+                # The log is in time order, so nothing further back can match
+                if start and row[0] < start:
+                    break
+                if (end and row[0] > end) or (status and row[5:6] != [status]) or (code and row[1:2] != [code]):
+                    continue
+                events.append(row_to_event(row))
+                if len(events) >= limit:
+                    next_position = offset
+                    break
+        return events, None if next_position is None else encode_cursor(self.name, next_position)
+
+    def _indexed_lines(self, file, code, before):
+        for offset, length in reversed(self.log_index.entries(code)):
+            if before is not None and offset >= before:
+                continue
+            file.seek(offset)
+            yield offset, file.read(length).rstrip(b'\r\n')
+
+    # Histogram of event log commit times
+    @property
+    def commit_latency(self):
+        return self.log_writer.commit_latency
+
+    def stats(self):
+        return {'backend': self.name,
+                'log_cache': self._log_cache.stats() if self._log_cache is not None else None,
+                'pending_writes': self.log_writer.pending(), 'journal': self.journal.stats()}
+
+
+# SQLite storage in WAL mode. Every thread gets its own connection; writes go
+# through one writer thread that commits whatever has queued up as a single
+# transaction, so callers (often holding battery_status_lock) never wait on disk.
+class SqliteStorage:
+    name = 'sqlite'
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS batteries (
+            code TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            last_change TEXT NOT NULL,
+            usage_count INTEGER NOT NULL DEFAULT 0,
+            notes TEXT NOT NULL DEFAULT '',
+            current_usage REAL,
+            battery_feel INTEGER,
+            charged_mah REAL,
+            awaiting_advanced_input INTEGER NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            battery_code TEXT NOT NULL,
+            team_number TEXT,
+            purchase_year TEXT,
+            battery_number TEXT,
+            status TEXT,
+            current_usage REAL,
+            battery_feel REAL,
+            charged_mah REAL
+        )""",
+        "CREATE INDEX IF NOT EXISTS events_battery_code ON events (battery_code, id)",
+        "CREATE INDEX IF NOT EXISTS events_timestamp ON events (timestamp)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+    ]
+
+    # Statements are kept as constants so sqlite3's per-connection statement
+    # cache reuses the prepared form
+    UPSERT_BATTERY = """INSERT INTO batteries (code, status, last_change, usage_count, notes, current_usage,
+                            battery_feel, charged_mah, awaiting_advanced_input)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (code) DO UPDATE SET
+                            status = excluded.status, last_change = excluded.last_change,
+                            usage_count = excluded.usage_count, notes = excluded.notes,
+                            current_usage = excluded.current_usage, battery_feel = excluded.battery_feel,
+                            charged_mah = excluded.charged_mah,
+                            awaiting_advanced_input = excluded.awaiting_advanced_input"""
+    DELETE_BATTERY = "DELETE FROM batteries WHERE code = ?"
+    SELECT_BATTERIES = """SELECT code, status, last_change, usage_count, notes, current_usage, battery_feel,
+                              charged_mah, awaiting_advanced_input FROM batteries"""
+    INSERT_EVENT = """INSERT INTO events (timestamp, battery_code, team_number, purchase_year, battery_number,
+                          status, current_usage, battery_feel, charged_mah)
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+    EVENT_COLUMNS = ('timestamp AS "Timestamp", battery_code AS "Battery Code", team_number AS "Team Number", '
+                     'purchase_year AS "Purchase Year", battery_number AS "Battery Number", status AS "Status", '
+                     'current_usage AS "Current Usage (J)", battery_feel AS "Battery Feel", '
+                     'charged_mah AS "Charged mAh"')
+    SELECT_EVENTS = f"SELECT {EVENT_COLUMNS} FROM events ORDER BY id"
+    SELECT_BATTERY_EVENTS = f"SELECT {EVENT_COLUMNS} FROM events WHERE battery_code = ? ORDER BY id"
+    SELECT_LOG_VERSION = "SELECT COALESCE(MAX(id), 0) FROM events"
+    # WHERE clauses for events_page; only the ones in use are joined together
+    PAGE_FILTERS = (
+        ('before', 'id < ?'),
+        ('code', 'battery_code = ?'),
+        ('status', 'status = ?'),
+        ('start', 'timestamp >= ?'),
+        ('end', 'timestamp <= ?')
+    )
+
+    def __init__(self, path, flush_interval=0.5, fsync_policy='interval'):
+        self.path = path
+        self.flush_interval = flush_interval
+        # 'every-commit' keeps synchronous=FULL; otherwise WAL's NORMAL is enough
+        self.synchronous = 'FULL' if fsync_policy == 'every-commit' else 'NORMAL'
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._thread = None
+        self.commits = 0
+        # Last failed commit, cleared by the next one that works
+        self.error = None
+        self.failures = 0
+        # Writes from failed commits, retried ahead of the next batch
+        self._unwritten = []
+        # Time to commit one batch of queued writes
+        self.commit_latency = Histogram()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, cached_statements=64)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(f'PRAGMA synchronous={self.synchronous}')
+            self._local.connection = connection
+        return connection
+
+    def open(self):
+        connection = self._connection()
+        with connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+        self._thread = threading.Thread(target=self._run_writer, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(('stop', None))
+            self._thread.join(5)
+            self._thread = None
+
+    def flush(self, timeout=None):
+        if self._thread is None:
+            return False
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        return done.wait(timeout) and self.error is None
+
+    def _run_writer(self):
+        connection = self._connection()
+        running = True
+        while running:
+            operations = [self._queue.get()]
+            # Everything that arrives within flush_interval of the first write
+            # goes into one transaction; flush and stop requests commit at once
+            deadline = time.monotonic() + self.flush_interval
+            while operations[-1][0] not in ('flush', 'stop') and len(operations) < 500:
+                remaining = deadline - time.monotonic()
+                try:
+                    operations.append(self._queue.get(timeout=remaining) if remaining > 0
+                                      else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            writes = [operation for operation in operations if operation[0] not in ('flush', 'stop')]
+            self._commit(connection, self._unwritten + writes)
+            for kind, item in operations:
+                if kind == 'flush':
+                    item.set()
+                elif kind == 'stop':
+                    running = False
+        if self._unwritten:
+            print(f"SQLite writer stopped with {len(self._unwritten)} writes not committed")
+
+    def _commit(self, connection, writes):
+        if not writes:
+            return
+        started = time.perf_counter()
+        try:
+            with connection:
+                for kind, item in writes:
+                    if kind == 'event':
+                        connection.execute(self.INSERT_EVENT, item)
+                    elif kind == 'battery':
+                        connection.execute(self.UPSERT_BATTERY, item)
+                    elif kind == 'delete':
+                        connection.execute(self.DELETE_BATTERY, (item,))
+        except sqlite3.Error as e:
+            # The transaction was rolled back; retry the writes with the next batch
+            self._unwritten = writes
+            self.error = str(e)
+            self.failures += 1
+            print(f"SQLite write failed, {len(writes)} writes kept for retry: {e}")
+            return
+        self._unwritten = []
+        self.commits += 1
+        self.commit_latency.observe(time.perf_counter() - started)
+        self.error = None
+
+    @staticmethod
+    def _battery_params(code, record):
+        return (
+            code, record.status.label, format_timestamp(record.last_change), record.usage_count, record.notes,
+            record.current_usage, record.battery_feel, record.charged_mAh, int(bool(record.awaiting_advanced_input))
+        )
+
+    @staticmethod
+    def _event_params(row):
+        return tuple(None if value in ('', None) else value for value in row)
+
+    def load_batteries(self):
+        rows = self._connection().execute(self.SELECT_BATTERIES).fetchall()
+        return {
+            code: deserialize_battery({
+                'status': status, 'last_change': last_change, 'usage_count': usage_count, 'notes': notes,
+                'current_usage': current_usage, 'battery_feel': battery_feel, 'charged_mAh': charged_mah,
+                'awaiting_advanced_input': bool(awaiting)
+            })
+            for code, status, last_change, usage_count, notes, current_usage, battery_feel, charged_mah, awaiting
+            in rows
+        }
+
+    def save_batteries(self, batteries):
+        for code, data in batteries.items():
+            self.save_battery(code, data)
+
+    # Every change is already committed on its own
+    def checkpoint_due(self):
+        return False
+
+    def write_error(self):
+        return self.error
+
+    def save_battery(self, code, data):
+        self._queue.put(('battery', self._battery_params(code, data)))
+
+    def delete_battery(self, code):
+        self._queue.put(('delete', code))
+
+    def append_event(self, row):
+        self._queue.put(('event', self._event_params(row)))
+
+    def _frame(self, query, params=()):
+        import pandas as pd
+        from analytics import NUMERIC_COLUMNS
+
+        frame = pd.read_sql_query(query, self._connection(), params=params)
+        frame['Timestamp'] = pd.to_datetime(frame['Timestamp'], format=TIMESTAMP_FORMAT, errors='coerce')
+        for column in NUMERIC_COLUMNS:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce')
+        return frame
+
+    def events_frame(self):
+        return self._frame(self.SELECT_EVENTS)
+
+    def battery_events_frame(self, code):
+        return self._frame(self.SELECT_BATTERY_EVENTS, (code,))
+
+    # Events are append-only, so the newest id identifies the log contents
+    def log_version(self):
+        return self._connection().execute(self.SELECT_LOG_VERSION).fetchone()[0]
+
+    def events_page(self, cursor=None, limit=50, code=None, status=None, start=None, end=None):
+        values = {'before': decode_cursor(cursor, self.name), 'code': code, 'status': status, 'start': start,
+                  'end': end}
+        clauses = [clause for name, clause in self.PAGE_FILTERS if values[name] is not None]
+        params = [values[name] for name, clause in self.PAGE_FILTERS if values[name] is not None]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connection().execute(
+            f"SELECT id, {self.EVENT_COLUMNS} FROM events {where} ORDER BY id DESC LIMIT ?", params + [limit]
+        ).fetchall()
+        events = [row_to_event(row[1:]) for row in rows]
+        next_cursor = encode_cursor(self.name, rows[-1][0]) if len(rows) >= limit else None
+        return events, next_cursor
+
+    def stats(self):
+        return {'backend': self.name, 'commits': self.commits, 'pending_writes': self._queue.qsize(),
+                'unwritten': len(self._unwritten), 'failures': self.failures, 'error': self.error}
+
+    # One-shot import of the JSON state file and CSV log. Runs only once per
+    # database; returns the number of (batteries, events) imported.
+    def import_legacy(self, state_path, log_path):
+        connection = self._connection()
+        if connection.execute("SELECT value FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return 0, 0
+
+        batteries = JsonCsvStorage(state_path, log_path).load_batteries()
+        events = 0
+        with connection:
+            for code, data in batteries.items():
+                connection.execute(self.UPSERT_BATTERY, self._battery_params(code, data))
+            if os.path.exists(log_path):
+                with open(log_path, mode='r', newline='') as file:
+                    reader = csv.reader(file)
+                    next(reader, None)
+                    for row in reader:
+                        row = (row + [''] * len(CSV_HEADER))[:len(CSV_HEADER)]
+                        connection.execute(self.INSERT_EVENT, self._event_params(row))
+                        events += 1
+            connection.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', ?)",
+                               (datetime.now().strftime(TIMESTAMP_FORMAT),))
+        return len(batteries), events
+
+
+def create_storage(backend, state_path, log_path, sqlite_path, flush_interval=0.5, fsync_policy='interval',
+                   fsync_interval=5.0, journal_flush_interval=0.05):
+    if backend == 'sqlite':
+        return SqliteStorage(sqlite_path, flush_interval=flush_interval, fsync_policy=fsync_policy)
+    if backend == 'json':
+        return JsonCsvStorage(state_path, log_path, flush_interval=flush_interval, fsync_policy=fsync_policy,
+                              fsync_interval=fsync_interval, journal_flush_interval=journal_flush_interval)
+    raise ValueError(f"Unknown storage backend {backend!r}")
+
+
+# python storage.py import [battery_status.json] [battery_log.csv] [battery_log.db]
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'import':
+        print("usage: python storage.py import [state.json] [log.csv] [database.db]")
+        sys.exit(1)
+    paths = sys.argv[2:5]
+    defaults = ['battery_status.json', 'battery_log.csv', 'battery_log.db']
+    state_file, log_file, database_file = paths + defaults[len(paths):]
+    sqlite_storage = SqliteStorage(database_file)
+    sqlite_storage.open()
+    imported_batteries, imported_events = sqlite_storage.import_legacy(state_file, log_file)
+    sqlite_storage.close()
+    print(f"Imported {imported_batteries} batteries and {imported_events} events into {database_file}")
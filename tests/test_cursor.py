@@ -0,0 +1,68 @@
+import pytest
+
+import main
+from storage import CSV_HEADER, JsonCsvStorage, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = JsonCsvStorage(str(tmp_path / 'state.json'), str(tmp_path / 'battery_log.csv'))
+    storage.open()
+    for minute in range(5):
+        storage.append_event([f'2024-10-31 16:{minute:02d}:00', 'A' if minute % 2 else 'B', '5411', '2024', '1',
+                              'Charging'] + [''] * (len(CSV_HEADER) - 6))
+    storage.flush()
+    yield storage
+    storage.close()
+
+
+def test_cursor_round_trips():
+    cursor = encode_cursor('json', 1234)
+    assert '=' not in cursor
+    assert decode_cursor(cursor, 'json') == 1234
+    assert decode_cursor(None, 'json') is None
+    assert decode_cursor('', 'json') is None
+
+
+@pytest.mark.parametrize('cursor', ['garbage', '!!!', encode_cursor('json', 'x'), 'anNvbg'])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 'json')
+
+
+def test_cursor_from_another_backend_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor('sqlite', 10), 'json')
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor('json', -1), 'json')
+
+
+def test_pages_follow_the_cursor(storage):
+    events, cursor = storage.events_page(None, 2)
+    assert [event['Timestamp'][-5:] for event in events] == ['04:00', '03:00']
+    events, cursor = storage.events_page(cursor, 2)
+    assert [event['Timestamp'][-5:] for event in events] == ['02:00', '01:00']
+    events, cursor = storage.events_page(cursor, 2)
+    assert [event['Timestamp'][-5:] for event in events] == ['00:00']
+    assert cursor is None
+
+
+def test_pages_by_code_follow_the_cursor(storage):
+    events, cursor = storage.events_page(None, 2, code='B')
+    assert [event['Timestamp'][-5:] for event in events] == ['04:00', '02:00']
+    events, cursor = storage.events_page(cursor, 2, code='B')
+    assert [event['Timestamp'][-5:] for event in events] == ['00:00']
+
+
+def test_api_logs_rejects_malformed_cursor(storage, monkeypatch):
+    monkeypatch.setattr(main, 'storage', storage)
+    client = main.app.test_client()
+    response = client.get('/api/logs?cursor=garbage')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+    response = client.get('/api/logs?limit=2')
+    assert response.status_code == 200
+    cursor = response.get_json()['next_cursor']
+    response = client.get(f'/api/logs?limit=2&cursor={cursor}')
+    assert [event['Timestamp'][-5:] for event in response.get_json()['events']] == ['02:00', '01:00']
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from figures import downsample, lttb
+
+
+@pytest.mark.parametrize('n, threshold', [(10, 3), (100, 10), (1000, 999), (1001, 50), (5000, 1000)])
+def test_lttb_keeps_endpoints_within_budget(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.uniform(0.5, 2.0, n))
+    y = rng.normal(size=n)
+    indices = lttb(x, y, threshold)
+    assert len(indices) == threshold
+    assert indices[0] == 0
+    assert indices[-1] == n - 1
+    assert np.all(np.diff(indices) > 0)
+
+
+@pytest.mark.parametrize('threshold', [0, 2, 10, 11])
+def test_lttb_returns_everything_when_nothing_to_drop(threshold):
+    assert list(lttb(list(range(10)), list(range(10)), threshold)) == list(range(10))
+
+
+def test_lttb_keeps_a_spike():
+    y = np.zeros(1000)
+    y[437] = 50.0
+    assert 437 in lttb(np.arange(1000), y, 20)
+
+
+def test_lttb_with_epoch_nanoseconds():
+    x = pd.date_range('2024-10-31', periods=500, freq='s').astype('int64').to_numpy()
+    y = np.sin(np.arange(500) / 10)
+    indices = lttb(x, y, 50)
+    assert len(indices) == 50 and indices[-1] == 499
+
+
+def test_downsample_applies_budget_per_group():
+    frame = pd.DataFrame({
+        'Timestamp': pd.date_range('2024-10-31', periods=300, freq='min').tolist() * 2,
+        'Usage': np.arange(600, dtype=float),
+        'Battery Code': ['A'] * 300 + ['B'] * 300
+    })
+    result = downsample(frame, 'Timestamp', 'Usage', 40, group='Battery Code')
+    assert result.groupby('Battery Code').size().to_dict() == {'A': 40, 'B': 40}
+    for _, part in result.groupby('Battery Code'):
+        assert part['Usage'].iloc[0] in (0, 300) and part['Usage'].iloc[-1] in (299, 599)
+
+
+def test_downsample_small_frame_untouched():
+    frame = pd.DataFrame({'x': [1, 2, 3], 'y': [1.0, None, 3.0]})
+    assert downsample(frame, 'x', 'y', 10)['x'].tolist() == [1, 3]
@@ -0,0 +1,83 @@
+import random
+import statistics
+
+import pytest
+
+from fleet import FleetUsage
+
+
+# The scan FleetUsage replaced: mean +/- 2 uses, over every battery
+def old_outliers(usage):
+    average = sum(usage.values()) / len(usage)
+    overused = [code for code, count in usage.items() if count >= average + 2]
+    underused = [code for code, count in usage.items() if count < average + 2 and count <= average - 2]
+    return overused, underused
+
+
+def fleet_of(usage):
+    fleet = FleetUsage()
+    for code, count in usage.items():
+        fleet.add(code, count)
+    return fleet
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_delta_rule_matches_old_scan(seed):
+    rng = random.Random(seed)
+    usage = {f'1294202400{n}': rng.randint(0, 12) for n in range(rng.randint(1, 30))}
+    overused, underused = fleet_of(usage).outliers('delta', 2)
+    expected_over, expected_under = old_outliers(usage)
+    assert set(overused) == set(expected_over)
+    assert set(underused) == set(expected_under)
+
+
+def test_delta_rule_at_exact_bounds():
+    # Mean 5: 7 is exactly mean + 2 and 3 exactly mean - 2
+    overused, underused = fleet_of({'a': 3, 'b': 5, 'c': 5, 'd': 7}).outliers('delta', 2)
+    assert overused == ['d']
+    assert underused == ['a']
+
+
+def test_outliers_follow_updates_and_removals():
+    usage = {'a': 0, 'b': 4, 'c': 4, 'd': 4}
+    fleet = fleet_of(usage)
+    assert fleet.outliers('delta', 2) == ([], ['a'])
+
+    fleet.update('a', 0, 4)
+    usage['a'] = 4
+    fleet.update('d', 4, 9)
+    usage['d'] = 9
+    assert fleet.outliers('delta', 2) == (['d'], [])
+
+    fleet.remove('d', 9)
+    del usage['d']
+    assert fleet.outliers('delta', 2) == ([], [])
+    assert fleet.mean() == pytest.approx(statistics.mean(usage.values()))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_zscore_rule(seed):
+    rng = random.Random(seed)
+    usage = {f'b{n}': rng.randint(0, 20) for n in range(rng.randint(2, 30))}
+    fleet = fleet_of(usage)
+    overused, underused = fleet.outliers('zscore', 1.5)
+
+    mean = statistics.mean(usage.values())
+    spread = 1.5 * statistics.pstdev(usage.values())
+    assert fleet.stddev() == pytest.approx(statistics.pstdev(usage.values()))
+    if spread == 0:
+        assert (overused, underused) == ([], [])
+        return
+    assert set(overused) == {code for code, count in usage.items() if count >= mean + spread}
+    assert set(underused) == {code for code, count in usage.items() if count <= mean - spread} - set(overused)
+    # Most extreme first
+    assert [usage[code] for code in overused] == sorted((usage[code] for code in overused), reverse=True)
+
+
+def test_zscore_rule_with_uniform_fleet():
+    assert fleet_of({'a': 3, 'b': 3}).outliers('zscore', 2) == ([], [])
+
+
+def test_unknown_rule():
+    with pytest.raises(ValueError):
+        fleet_of({'a': 1}).outliers('median', 2)
@@ -0,0 +1,29 @@
+import csv
+import os
+
+from frame_sources import battery_barcode, ean13_check_digit, ean13_modules
+from main import parse_battery_code
+
+LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'battery_log.csv')
+
+
+def test_battery_barcode_matches_logged_codes():
+    with open(LOG_PATH, newline='') as f:
+        logged = next(row for row in csv.DictReader(f) if len(row['Battery Code']) == 11)
+
+    info = parse_battery_code(logged['Battery Code'])
+    code = battery_barcode(info['team_number'], info['purchase_year'], info['battery_number'])
+
+    # The scanner drops the check digit
+    assert code[:-1] == logged['Battery Code']
+    assert parse_battery_code(code[:-1])['battery_number'] == logged['Battery Number']
+
+
+def test_battery_barcode_is_upca():
+    code = battery_barcode('1294', 2024, 1)
+    assert code == '12942024001' + ean13_check_digit('012942024001')
+    assert len(ean13_modules(code)) == 95
+
+
+def test_check_digit_of_known_upca():
+    assert ean13_check_digit('0' + '03600029145') == '2'
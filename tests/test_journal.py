@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+from journal import StateJournal
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'state.json.journal'), str(tmp_path / 'state.json')
+
+
+def write_lines(path, entries, torn=None):
+    with open(path, 'w') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+        if torn is not None:
+            f.write(torn)
+
+
+def test_recover_ignores_torn_last_line(paths):
+    journal_path, checkpoint_path = paths
+    write_lines(journal_path, [{'op': 'put', 'code': 'A', 'data': {'status': 'Charging'}}],
+                torn='{"op": "put", "code": "B", "da')
+
+    journal = StateJournal(journal_path, checkpoint_path)
+    assert journal.recover() == {'A': {'status': 'Charging'}}
+    assert journal.entries_since_checkpoint == 1
+
+
+def test_recover_replays_journal_left_behind_by_checkpoint(paths):
+    journal_path, checkpoint_path = paths
+    # Crash after os.replace() put the new checkpoint in place but before the
+    # journal was truncated: every entry is already in the checkpoint
+    with open(checkpoint_path, 'w') as f:
+        json.dump({'A': {'status': 'In Use'}}, f)
+    write_lines(journal_path, [
+        {'op': 'put', 'code': 'A', 'data': {'status': 'Charging'}},
+        {'op': 'put', 'code': 'B', 'data': {'status': 'Charging'}},
+        {'op': 'del', 'code': 'B'},
+        {'op': 'put', 'code': 'A', 'data': {'status': 'In Use'}}
+    ])
+
+    assert StateJournal(journal_path, checkpoint_path).recover() == {'A': {'status': 'In Use'}}
+
+
+def test_checkpoint_then_recover(paths):
+    journal = StateJournal(*paths, flush_interval=0.01)
+    journal.start()
+    journal.put('A', {'status': 'Charging'})
+    journal.checkpoint({'A': {'status': 'Charging'}})
+    journal.put('B', {'status': 'In Use'})
+    assert journal.flush(timeout=5)
+    journal.stop()
+
+    with open(paths[0]) as f:
+        assert len(f.readlines()) == 1
+    assert StateJournal(*paths).recover() == {'A': {'status': 'Charging'}, 'B': {'status': 'In Use'}}
+
+
+def test_failed_append_is_reported_and_retried(paths, monkeypatch):
+    journal = StateJournal(*paths, flush_interval=0.01)
+    journal.start()
+    journal.put('A', {'status': 'Charging'})
+    assert journal.flush(timeout=5)
+
+    real_fsync = os.fsync
+
+    def full_disk(fd):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(os, 'fsync', full_disk)
+    journal.put('B', {'status': 'In Use'})
+    assert not journal.flush(timeout=5)
+    assert journal.failures >= 1
+    assert 'No space left' in journal.error
+    # The failed batch was cut back off the file
+    assert StateJournal(*paths).recover() == {'A': {'status': 'Charging'}}
+
+    monkeypatch.setattr(os, 'fsync', real_fsync)
+    journal.put('C', {'status': 'Charging'})
+    assert journal.flush(timeout=5)
+    assert journal.error is None
+    journal.stop()
+    assert StateJournal(*paths).recover() == {
+        'A': {'status': 'Charging'}, 'B': {'status': 'In Use'}, 'C': {'status': 'Charging'}}
+
+
+def test_failed_checkpoint_keeps_journal(paths, monkeypatch):
+    journal = StateJournal(*paths, flush_interval=0.01)
+    journal.start()
+    journal.put('A', {'status': 'Charging'})
+
+    def fail_replace(src, dst):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(os, 'replace', fail_replace)
+    journal.checkpoint({'A': {'status': 'Charging'}})
+    assert not journal.flush(timeout=5)
+    assert journal._thread.is_alive()
+    assert journal.entries_since_checkpoint == 1
+    journal.stop()
+    assert StateJournal(*paths).recover() == {'A': {'status': 'Charging'}}
@@ -0,0 +1,79 @@
+import pytest
+
+from log_index import LogIndex
+
+HEADER = b'Timestamp,Battery Code,Status\n'
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = tmp_path / 'battery_log.csv'
+    path.write_bytes(HEADER + b'2024-10-31 16:33:11,A,In Use\n2024-10-31 16:34:00,B,Charging\n'
+                     b'2024-10-31 16:35:00,A,Charging\n')
+    return str(path)
+
+
+def load(path):
+    index = LogIndex(path)
+    index.load()
+    index.close()
+    return index
+
+
+def test_indexes_rows_by_code(log_path):
+    index = load(log_path)
+    assert len(index.entries('A')) == 2
+    assert index.read_rows('B') == HEADER + b'2024-10-31 16:34:00,B,Charging\n'
+
+
+def test_reuses_sidecar_and_catches_up_on_appended_rows(log_path):
+    load(log_path)
+    with open(log_path, 'ab') as f:
+        f.write(b'2024-10-31 16:36:00,B,In Use\n')
+    index = load(log_path)
+    assert len(index.entries('B')) == 2
+    assert index.read_rows('B').endswith(b'2024-10-31 16:36:00,B,In Use\n')
+
+
+def test_rebuilds_when_header_changes(log_path):
+    load(log_path)
+    with open(log_path, 'wb') as f:
+        f.write(b'Timestamp,Battery Code,Status,Notes\n2024-11-01 10:00:00,C,In Use,\n')
+    index = load(log_path)
+    assert index.entries('A') == []
+    assert len(index.entries('C')) == 1
+
+
+def test_rebuilds_when_log_rewritten_with_same_header(log_path):
+    load(log_path)
+    # Rotated: same header, at least as long, different rows
+    with open(log_path, 'wb') as f:
+        f.write(HEADER + b'2024-11-01 10:00:00,C,In Use\n2024-11-01 10:00:01,D,In Use\n'
+                b'2024-11-01 10:00:02,C,Charging\n2024-11-01 10:00:03,E,Charging\n')
+    index = load(log_path)
+    assert index.entries('A') == []
+    assert [len(index.entries(code)) for code in 'CDE'] == [2, 1, 1]
+    assert index.read_rows('C') == HEADER + b'2024-11-01 10:00:00,C,In Use\n2024-11-01 10:00:02,C,Charging\n'
+
+
+def test_rebuilds_sidecar_in_old_format(log_path):
+    with open(log_path + '.idx', 'w') as f:
+        f.write('#0\nA,0,10\n')
+    index = load(log_path)
+    assert len(index.entries('A')) == 2
+
+
+def test_log_writer_commits_are_indexed(log_path):
+    from log_writer import LogWriter
+
+    index = LogIndex(log_path)
+    index.load()
+    writer = LogWriter(log_path, ['Timestamp', 'Battery Code', 'Status'], flush_interval=0.01,
+                       on_commit=index.record_commit)
+    writer.start()
+    writer.write(['2024-10-31 16:40:00', 'B', 'In Use'])
+    assert writer.flush(timeout=5)
+    writer.stop()
+    index.close()
+
+    assert load(log_path).read_rows('B').endswith(b'2024-10-31 16:40:00,B,In Use\r\n')
@@ -0,0 +1,77 @@
+import http.client
+import socket
+
+import pytest
+from flask import Flask, Response, request
+
+from serving import PooledWSGIServer
+
+
+@pytest.fixture
+def server():
+    app = Flask(__name__)
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        return request.get_data()
+
+    @app.route('/api/events')
+    def events():
+        return Response(iter(['data: 1\n\n']), mimetype='text/event-stream')
+
+    server = PooledWSGIServer('127.0.0.1', 0, app, threads=2, streaming_paths=('/api/events',))
+    server.start()
+    yield server
+    server.stop_accepting()
+    server.drain(2)
+
+
+def connect(server):
+    return http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+
+
+def test_connection_is_kept_alive_between_requests(server):
+    connection = connect(server)
+    for _ in range(3):
+        connection.request('GET', '/ping')
+        response = connection.getresponse()
+        assert response.read() == b'pong'
+        assert response.getheader('Connection') == 'keep-alive'
+    connection.request('POST', '/echo', body=b'hello')
+    assert connection.getresponse().read() == b'hello'
+    assert server.stats()['keepalive_reuses'] == 3
+
+
+def test_streams_close_their_connection(server):
+    connection = connect(server)
+    connection.request('GET', '/api/events')
+    response = connection.getresponse()
+    assert response.read() == b'data: 1\n\n'
+    assert response.getheader('Connection') == 'close'
+
+
+def test_idle_connections_do_not_hold_workers(server):
+    idle = []
+    for _ in range(6):
+        connection = connect(server)
+        connection.request('GET', '/ping')
+        connection.getresponse().read()
+        idle.append(connection)
+    # Two workers, six idle connections: a new client is still served
+    connection = connect(server)
+    connection.request('GET', '/ping')
+    assert connection.getresponse().read() == b'pong'
+
+
+def test_pipelined_requests_are_all_answered(server):
+    with socket.create_connection(('127.0.0.1', server.server_address[1]), timeout=5) as client:
+        client.sendall(b'GET /ping HTTP/1.1\r\nHost: test\r\n\r\n'
+                       b'GET /ping HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n')
+        data = b''
+        while chunk := client.recv(4096):
+            data += chunk
+    assert data.count(b'pong') == 2
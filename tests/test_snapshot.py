@@ -0,0 +1,45 @@
+from snapshot import FleetSnapshot
+
+
+def evolve(snapshot, *codes, removed=(), change_log_size=256):
+    changes = {code: code.lower() for code in codes}
+    changes.update({code: None for code in removed})
+    return snapshot.evolve(changes, (), (), change_log_size=change_log_size)
+
+
+def test_changed_since_collects_codes_after_version():
+    snapshot = evolve(evolve(evolve(FleetSnapshot(), 'A'), 'B'), 'C', removed=['A'])
+    assert snapshot.version == 3
+    assert snapshot.changed_since(1) == {'A', 'B', 'C'}
+    assert snapshot.changed_since(2) == {'A', 'C'}
+    assert snapshot.changed_since(0) == {'A', 'B', 'C'}
+    assert snapshot.batteries == {'B': 'b', 'C': 'c'}
+
+
+def test_changed_since_current_version_is_empty():
+    snapshot = evolve(FleetSnapshot(), 'A')
+    assert snapshot.changed_since(snapshot.version) == set()
+    assert FleetSnapshot().changed_since(0) == set()
+
+
+def test_changed_since_future_version():
+    snapshot = evolve(FleetSnapshot(), 'A')
+    assert snapshot.changed_since(snapshot.version + 1) is None
+
+
+def test_changed_since_too_far_behind():
+    snapshot = FleetSnapshot()
+    for number in range(10):
+        snapshot = evolve(snapshot, f'B{number}', change_log_size=4)
+    # The log holds versions 7 to 10, so 6 is the oldest version it can answer for
+    assert [version for version, _ in snapshot.changes] == [7, 8, 9, 10]
+    assert snapshot.changed_since(6) == {'B6', 'B7', 'B8', 'B9'}
+    assert snapshot.changed_since(5) is None
+    assert snapshot.changed_since(0) is None
+
+
+def test_evolve_leaves_the_published_snapshot_alone():
+    first = evolve(FleetSnapshot(), 'A')
+    second = evolve(first, removed=['A'])
+    assert first.batteries == {'A': 'a'}
+    assert second.batteries == {}
@@ -0,0 +1,47 @@
+import sqlite3
+import time
+
+import pytest
+
+from storage import CSV_HEADER, SqliteStorage
+
+
+def event(minute):
+    return [f'2024-10-31 16:{minute:02d}:00', 'A', '5411', '2024', '1', 'Charging'] + [''] * (len(CSV_HEADER) - 6)
+
+
+def committed_events(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SqliteStorage(str(tmp_path / 'battery_log.db'), flush_interval=0.3)
+    storage.open()
+    yield storage
+    storage.close()
+
+
+def test_steady_writes_commit_within_flush_interval(storage):
+    # Writes arriving faster than flush_interval must not hold the batch open
+    for minute in range(8):
+        storage.append_event(event(minute))
+        time.sleep(0.1)
+    assert committed_events(storage.path) >= 4
+
+
+def test_failed_commit_is_retried(storage):
+    insert_event = storage.INSERT_EVENT
+    storage.INSERT_EVENT = 'INSERT INTO missing_table VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+    storage.append_event(event(0))
+    storage.append_event(event(1))
+    assert not storage.flush(2)
+    assert storage.stats()['unwritten'] == 2
+    assert committed_events(storage.path) == 0
+
+    storage.INSERT_EVENT = insert_event
+    assert storage.flush(2)
+    assert storage.stats()['unwritten'] == 0
+    assert storage.error is None
+    assert committed_events(storage.path) == 2